@@ -0,0 +1,102 @@
+from database import get_shard_db, shard_ids
+from datetime import datetime, timedelta
+import argparse
+import idempotency
+import time
+
+ARCHIVE_STATUSES = ("completed", "cancelled")
+
+
+def ensure_partitions(db, months_ahead=2):
+    cursor = db.cursor()
+    month = datetime.now().replace(day=1)
+    for _ in range(months_ahead + 1):
+        cursor.callproc("add_reservation_partition", [month.date()])
+        month = (month + timedelta(days=32)).replace(day=1)
+    db.commit()
+    cursor.close()
+
+
+def archive_batch(db, cutoff, batch_size):
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT reservation_id FROM reservations
+            WHERE status IN (%s, %s) AND start_time < %s
+            ORDER BY start_time
+            LIMIT %s
+        """, (*ARCHIVE_STATUSES, cutoff, batch_size))
+        ids = [row[0] for row in cursor.fetchall()]
+
+        if not ids:
+            return 0
+
+        placeholders = ", ".join(["%s"] * len(ids))
+        cursor.execute(f"""
+            INSERT IGNORE INTO reservations_archive
+                (reservation_id, user_id, lot_id, start_time, end_time, total_cost, status, created_at)
+            SELECT reservation_id, user_id, lot_id, start_time, end_time, total_cost, status, created_at
+            FROM reservations
+            WHERE reservation_id IN ({placeholders})
+        """, ids)
+        cursor.execute(f"""
+            DELETE FROM reservations
+            WHERE reservation_id IN ({placeholders}) AND status IN (%s, %s)
+        """, (*ids, *ARCHIVE_STATUSES))
+
+        db.commit()
+        return len(ids)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def archive_shard(shard_id, retention_days, batch_size, pause):
+    db = get_shard_db(shard_id, batch=True)
+    if not db:
+        print(f"Database connection failed for shard {shard_id}!")
+        return
+
+    try:
+        ensure_partitions(db)
+
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        total = 0
+        while True:
+            moved = archive_batch(db, cutoff, batch_size)
+            total += moved
+            if moved < batch_size:
+                break
+            # give booking transactions a chance at the locks between batches
+            time.sleep(pause)
+
+        print(f"Shard {shard_id}: archived {total} reservations older than {cutoff:%Y-%m-%d}")
+
+        cursor = db.cursor()
+        cursor.execute("""
+            DELETE FROM idempotency_keys
+            WHERE created_at < NOW() - INTERVAL %s SECOND
+        """, (idempotency.TTL_SECONDS,))
+        purged = cursor.rowcount
+        db.commit()
+        cursor.close()
+        print(f"Shard {shard_id}: purged {purged} expired idempotency keys")
+    finally:
+        db.close()
+
+
+def archive_reservations(retention_days=90, batch_size=500, pause=0.1):
+    for shard_id in shard_ids():
+        archive_shard(shard_id, retention_days, batch_size, pause)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old completed/cancelled reservations to reservations_archive")
+    parser.add_argument("--retention-days", type=int, default=90)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.1)
+    args = parser.parse_args()
+
+    archive_reservations(args.retention_days, args.batch_size, args.pause)
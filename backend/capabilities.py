@@ -0,0 +1,79 @@
+from database import get_db
+import threading
+
+# optional schema objects from advanced_database_features.sql and the later migrations;
+# endpoints pick their queries from what was found instead of trying and falling back per request
+# columns added to existing tables by a migration, probed as "table.column"
+OPTIONAL_COLUMNS = ["parking_lots.sensor_occupied_spots"]
+
+_capabilities = None
+_lock = threading.Lock()
+
+
+def probe():
+    db = get_db()
+    if not db:
+        return None
+
+    cursor = db.cursor()
+    try:
+        cursor.execute("""
+            SELECT table_name, table_type FROM information_schema.tables
+            WHERE table_schema = DATABASE()
+        """)
+        tables = cursor.fetchall()
+        cursor.execute("""
+            SELECT routine_name, routine_type FROM information_schema.routines
+            WHERE routine_schema = DATABASE()
+        """)
+        routines = cursor.fetchall()
+        cursor.execute("""
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+        """)
+        columns = [f"{table}.{column}" for table, column in cursor.fetchall()]
+    except Exception as e:
+        print("Error probing schema capabilities:", e)
+        return None
+    finally:
+        cursor.close()
+        db.close()
+
+    return {
+        "tables": sorted(name for name, kind in tables if kind == "BASE TABLE"),
+        "views": sorted(name for name, kind in tables if kind == "VIEW"),
+        "functions": sorted(name for name, kind in routines if kind == "FUNCTION"),
+        "procedures": sorted(name for name, kind in routines if kind == "PROCEDURE"),
+        "columns": sorted(name for name in columns if name in OPTIONAL_COLUMNS),
+    }
+
+
+def refresh():
+    global _capabilities
+    capabilities = probe()
+    if capabilities is not None:
+        objects = set()
+        for names in capabilities.values():
+            objects.update(names)
+        with _lock:
+            _capabilities = (capabilities, objects)
+    return capabilities
+
+
+def current():
+    cached = _capabilities
+    if cached is None:
+        # the database was unreachable at startup; probe again on first use
+        refresh()
+        cached = _capabilities
+    return cached
+
+
+def has(name):
+    cached = current()
+    return cached is not None and name in cached[1]
+
+
+def describe():
+    cached = current()
+    return cached[0] if cached else None
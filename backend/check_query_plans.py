@@ -0,0 +1,282 @@
+from database import get_db
+from repository import LOT_COLUMNS
+from datetime import datetime, timedelta
+import argparse
+import ast
+import capabilities
+import os
+import random
+import re
+import sys
+
+# routes/parking.py issues its SQL through repository.py
+SOURCES = ["routes/parking.py", "routes/admin.py", "repository.py"]
+STATEMENT = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+PLACEHOLDER = re.compile(r"%s")
+
+# plans that scan more rows than this without an index, or sort them, fail the check
+LARGE_TABLE_ROWS = int(os.getenv("PLAN_CHECK_LARGE_ROWS", "1000"))
+
+# f-string parts that are built from request data; explained with a representative value
+FSTRING_SAMPLES = {
+    "', '.join(updates)": "hourly_rate = %s",
+    "' AND '.join(filters)": "location = %s",
+    "assignment": "hourly_rate = %s",
+    "id_list": "%s",
+    # the optional sensor column does not change the plan and may not be installed
+    "lot_columns()": LOT_COLUMNS,
+    "sensor_column": "",
+}
+
+# tables a {table} template is formatted with before it is run
+TEMPLATE_TABLES = ["reservations", "reservations_archive"]
+
+# objects from the optional migrations; EXPLAIN may fail on them only when capabilities did not find them
+OPTIONAL_OBJECTS = [
+    "reservations_archive",
+    "user_shards",
+    "v_user_bookings",
+    "v_lot_revenue_summary",
+    "v_parking_lot_summary",
+    "calculate_parking_cost",
+    "check_available_spots",
+    "get_lot_status",
+]
+
+# statements that read a whole table on purpose
+EXPECTED_FULL_SCANS = {
+    "repository.py:RESERVATION_HISTORY_QUERY",
+    "repository.py:ARCHIVED_RESERVATION_HISTORY_QUERY",
+    "repository.py:MySQLRepository.list_users",
+    "repository.py:MySQLRepository.list_lots",
+}
+
+
+def _labelled_nodes(tree):
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            yield node.name, node
+        elif isinstance(node, ast.ClassDef):
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef):
+                    yield f"{node.name}.{item.name}", item
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            yield node.targets[0].id, node
+
+
+def _module_constants(tree):
+    constants = {}
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and isinstance(node.targets[0], ast.Name)
+            and isinstance(node.value, ast.Constant)
+            and isinstance(node.value.value, str)
+        ):
+            constants[node.targets[0].id] = node.value.value
+    return constants
+
+
+def _render_fstring(node, constants):
+    parts = []
+    for part in node.values:
+        if isinstance(part, ast.Constant):
+            parts.append(part.value)
+            continue
+        expression = ast.unparse(part.value)
+        literals = [
+            child.value for child in ast.walk(part.value)
+            if isinstance(child, ast.Constant) and isinstance(child.value, str)
+        ]
+        if expression in FSTRING_SAMPLES:
+            parts.append(FSTRING_SAMPLES[expression])
+        elif expression in constants:
+            parts.append(constants[expression])
+        elif "%s" in literals:
+            # ', '.join(['%s'] * len(ids)) and the like
+            parts.append("%s")
+        else:
+            return None
+    return "".join(parts)
+
+
+def extract_statements(base_dir):
+    statements = []
+    for source in SOURCES:
+        with open(os.path.join(base_dir, source)) as f:
+            tree = ast.parse(f.read())
+        constants = _module_constants(tree)
+
+        for label, node in _labelled_nodes(tree):
+            fragments = {
+                id(part) for child in ast.walk(node) if isinstance(child, ast.JoinedStr) for part in child.values
+            }
+            for child in ast.walk(node):
+                if isinstance(child, ast.JoinedStr):
+                    head = child.values[0] if child.values else None
+                    if not (isinstance(head, ast.Constant) and STATEMENT.match(head.value)):
+                        continue
+                    # None marks an f-string that needs an entry in FSTRING_SAMPLES
+                    statements.append((f"{source}:{label}", child.lineno, _render_fstring(child, constants)))
+                elif (
+                    isinstance(child, ast.Constant)
+                    and isinstance(child.value, str)
+                    and id(child) not in fragments
+                    and STATEMENT.match(child.value)
+                ):
+                    if "{table}" in child.value:
+                        for table in TEMPLATE_TABLES:
+                            statements.append((f"{source}:{label}[{table}]", child.lineno, child.value.format(table=table)))
+                    else:
+                        statements.append((f"{source}:{label}", child.lineno, child.value))
+    return statements
+
+
+def missing_optional_objects(sql):
+    return [
+        name for name in OPTIONAL_OBJECTS
+        if re.search(rf"\b{name}\b", sql) and not capabilities.has(name)
+    ]
+
+
+def sample_params(sql):
+    params = []
+    for match in PLACEHOLDER.finditer(sql):
+        words = re.findall(r"[A-Za-z_]+", sql[:match.start()])
+        name = words[-1].lower() if words else ""
+        if name in ("limit", "offset", "interval") or name.endswith("_id") or name in ("priority", "total_spots"):
+            params.append(1)
+        elif "time" in name or "date" in name or name.endswith("_at"):
+            params.append(datetime.now())
+        elif name == "status":
+            params.append("active")
+        else:
+            params.append("x")
+    return params
+
+
+def explain(cursor, sql):
+    cursor.execute("EXPLAIN " + sql, sample_params(sql))
+    return cursor.fetchall()
+
+
+def plan_problems(plan):
+    problems = []
+    for row in plan:
+        table = row.get("table") or ""
+        rows = int(row.get("rows") or 0)
+        extra = row.get("Extra") or ""
+        if table.startswith("<") or rows < LARGE_TABLE_ROWS:
+            continue
+        if row.get("type") == "ALL":
+            problems.append(f"full scan of {table} (~{rows} rows)")
+        if "Using filesort" in extra:
+            problems.append(f"filesort on {table} (~{rows} rows)")
+    return problems
+
+
+def seed(db, reservations):
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT lot_id, available_spots FROM parking_lots")
+        lots = cursor.fetchall()
+        if not lots:
+            print("Seeding needs at least one parking lot")
+            return
+        cursor.execute("SELECT spot_id FROM parking_spots WHERE is_occupied = 0")
+        free_spots = [row["spot_id"] for row in cursor.fetchall()]
+
+        users = max(1, reservations // 10)
+        cursor.executemany(
+            "INSERT IGNORE INTO users (name, email, password_hash, role) VALUES (%s, %s, %s, 'driver')",
+            [(f"Plan Check {i}", f"plan-check-{i}@example.invalid", "x") for i in range(users)]
+        )
+        cursor.execute("SELECT user_id FROM users WHERE email LIKE 'plan-check-%@example.invalid'")
+        user_ids = [row["user_id"] for row in cursor.fetchall()]
+
+        now = datetime.now()
+        rows = []
+        for _ in range(reservations):
+            start = now - timedelta(hours=random.randint(0, 24 * 365))
+            rows.append((
+                random.choice(user_ids), random.choice(lots)["lot_id"], start, start + timedelta(hours=random.randint(1, 8)),
+                random.randint(10, 400), random.choice(["completed", "completed", "cancelled", "active"]), start
+            ))
+        cursor.executemany("""
+            INSERT INTO reservations (user_id, lot_id, start_time, end_time, total_cost, status, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+
+        # after_reservation_insert occupies a spot for every row; put the real counts back
+        cursor.executemany(
+            "UPDATE parking_lots SET available_spots = %s WHERE lot_id = %s",
+            [(lot["available_spots"], lot["lot_id"]) for lot in lots]
+        )
+        if free_spots:
+            cursor.execute(
+                f"UPDATE parking_spots SET is_occupied = 0 WHERE spot_id IN ({', '.join(['%s'] * len(free_spots))})",
+                free_spots
+            )
+        db.commit()
+
+        cursor.execute("ANALYZE TABLE reservations, users")
+        cursor.fetchall()
+        print(f"Seeded {len(user_ids)} users and {reservations} reservations")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def check_query_plans(seed_reservations=0, verbose=False):
+    # seeding inserts many rows at once, beyond the request query timeout
+    db = get_db(batch=True)
+    if not db:
+        print("Database connection failed!")
+        return False
+
+    if seed_reservations:
+        seed(db, seed_reservations)
+
+    cursor = db.cursor(dictionary=True)
+    failures = 0
+    try:
+        for label, line, sql in extract_statements(os.path.dirname(os.path.abspath(__file__))):
+            if sql is None:
+                failures += 1
+                print(f"FAIL {label} (line {line}): f-string part without a sample in FSTRING_SAMPLES")
+                continue
+
+            try:
+                plan = explain(cursor, sql)
+            except Exception as e:
+                missing = missing_optional_objects(sql)
+                if not missing:
+                    failures += 1
+                    print(f"FAIL {label} (line {line}): {e}")
+                else:
+                    print(f"SKIP {label} (line {line}): {', '.join(missing)} not installed")
+                continue
+
+            problems = plan_problems(plan)
+            if problems and label not in EXPECTED_FULL_SCANS:
+                failures += 1
+                print(f"FAIL {label} (line {line}): {'; '.join(problems)}")
+            elif verbose:
+                print(f"ok   {label} (line {line})")
+    finally:
+        cursor.close()
+        db.close()
+
+    print(f"{failures} statement(s) with degraded plans or errors")
+    return failures == 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN every SQL statement used by the API and flag full scans and filesorts")
+    parser.add_argument("--seed", type=int, default=0, help="insert this many synthetic reservations first (local databases only)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_query_plans(args.seed, args.verbose) else 1)
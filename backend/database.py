@@ -1,30 +1,355 @@
-import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from mysql.connector import pooling
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import hashlib
+import itertools
+import threading
+import time
 import os
 
 load_dotenv()
 
-def get_db():
-    try:
-        host = os.getenv("DB_HOST", "localhost")
+# FastAPI runs up to 40 sync handlers at once and the background jobs share the pool, so start at
+# mysql-connector's maximum pool size and let callers wait briefly for a connection instead of failing
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "32"))
+POOL_WAIT_SECONDS = float(os.getenv("DB_POOL_WAIT_SECONDS", "2"))
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "2"))
+STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", "10"))
+# connecting only; an unreachable server fails fast and trips the breaker
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# waiting on a query result in request handlers, so a stalled server errors out instead of blocking workers
+QUERY_TIMEOUT = int(os.getenv("DB_QUERY_TIMEOUT", "10"))
+# analytics, finance exports and maintenance jobs run long scans on their own small pools; 0 waits indefinitely
+BATCH_POOL_SIZE = int(os.getenv("DB_BATCH_POOL_SIZE", "4"))
+BATCH_QUERY_TIMEOUT = int(os.getenv("DB_BATCH_QUERY_TIMEOUT", "0"))
+# after this many consecutive failures a server is skipped for DB_BREAKER_RESET_SECONDS
+BREAKER_FAILURES = int(os.getenv("DB_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.getenv("DB_BREAKER_RESET_SECONDS", "10"))
+# each shard allocates lot, reservation and waitlist ids from its own range, so an id alone names its shard
+SHARD_ID_STRIDE = int(os.getenv("DB_SHARD_ID_STRIDE", "100000000"))
+SHARD_VIRTUAL_NODES = 64
+# threads shared by every fan_out call; each one holds at most one connection at a time
+FAN_OUT_WORKERS = int(os.getenv("DB_FAN_OUT_WORKERS", "16"))
+
+_pools = {}
+_pools_lock = threading.Lock()
+# (host, port) -> [consecutive failures, time the breaker opened or None]
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# replica -> (checked_at, healthy)
+_replica_health = {}
+_health_lock = threading.Lock()
+
+# user_id -> time of that user's last write, for read-your-writes stickiness
+_recent_writes = {}
+_writes_lock = threading.Lock()
+
+
+def _parse_hosts(value):
+    hosts = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(":")
         if host == "localhost":
             host = "127.0.0.1"
-        
-        db = mysql.connector.connect(
-            host=host,
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-            port=3306,
-            use_unicode=True,
-            charset='utf8mb4'
-        )
+        hosts.append((host, int(port) if port else 3306))
+    return hosts
+
+
+def _primary_host():
+    host = os.getenv("DB_HOST", "localhost")
+    if host == "localhost":
+        host = "127.0.0.1"
+    return host, int(os.getenv("DB_PORT", "3306"))
+
+
+REPLICAS = _parse_hosts(os.getenv("DB_REPLICA_HOSTS"))
+_replica_cycle = itertools.cycle(REPLICAS) if REPLICAS else None
+
+
+def _parse_shards(value):
+    shards = {}
+    for item in (value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        number, _, address = item.partition("=")
+        shards[int(number)] = _parse_hosts(address)[0]
+    return shards
+
+
+def _parse_regions(value):
+    regions = {}
+    for item in (value or "").split(","):
+        location, _, shard = item.partition("=")
+        if location.strip() and shard.strip():
+            regions[location.strip().lower()] = int(shard)
+    return regions
+
+
+def _ring_hash(value):
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+# shard number -> (host, port); shard 0 is the primary above and keeps users, vehicles and all pre-sharding ids
+SHARDS = _parse_shards(os.getenv("DB_SHARDS"))
+SHARDS[0] = _primary_host()
+# location -> shard for new lots, e.g. "Bangalore=0,Mumbai=1"; other locations are placed on the hash ring
+REGION_SHARDS = {
+    location: shard for location, shard in _parse_regions(os.getenv("DB_SHARD_REGIONS")).items() if shard in SHARDS
+}
+_ring = sorted(
+    (_ring_hash(f"shard-{shard}-{node}"), shard) for shard in SHARDS for node in range(SHARD_VIRTUAL_NODES)
+)
+_ring_keys = [key for key, _ in _ring]
+
+
+def _get_pool(host, port, batch=False):
+    key = (host, port, batch)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"parking_{'batch_' if batch else ''}{host}_{port}",
+                    pool_size=BATCH_POOL_SIZE if batch else POOL_SIZE,
+                    host=host,
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    database=os.getenv("DB_NAME"),
+                    port=port,
+                    connection_timeout=CONNECT_TIMEOUT,
+                    read_timeout=(BATCH_QUERY_TIMEOUT if batch else QUERY_TIMEOUT) or None,
+                    use_unicode=True,
+                    charset='utf8mb4'
+                )
+                _pools[key] = pool
+    return pool
 
+
+def _breaker_allows(key):
+    with _breakers_lock:
+        state = _breakers.get(key)
+        if not state or state[1] is None:
+            return True
+        if time.monotonic() - state[1] < BREAKER_RESET_SECONDS:
+            return False
+        # half-open: let this request try the server, the rest keep failing fast until it answers
+        state[1] = time.monotonic()
+        return True
+
+
+def _record_failure(key):
+    with _breakers_lock:
+        state = _breakers.setdefault(key, [0, None])
+        state[0] += 1
+        if state[0] >= BREAKER_FAILURES and state[1] is None:
+            state[1] = time.monotonic()
+            print(f"MySQL at {key[0]}:{key[1]} failed {state[0]} times, failing fast for {BREAKER_RESET_SECONDS}s")
+
+
+def _record_success(key):
+    with _breakers_lock:
+        state = _breakers.get(key)
+        if state and state[0]:
+            if state[1] is not None:
+                print(f"MySQL at {key[0]}:{key[1]} is reachable again")
+            _breakers[key] = [0, None]
+
+
+def report_failure(db):
+    # called by the repository when a query on db loses the connection or times out
+    try:
+        _record_failure((db.server_host, db.server_port))
+    except Exception:
+        pass
+
+
+def breaker_states():
+    now = time.monotonic()
+    with _breakers_lock:
+        return [
+            {
+                "server": f"{host}:{port}",
+                "consecutive_failures": failures,
+                "open": opened is not None and now - opened < BREAKER_RESET_SECONDS,
+            }
+            for (host, port), (failures, opened) in _breakers.items()
+        ]
+
+
+def _checkout(pool):
+    # get_connection() raises PoolError at once when every connection is in use; retry until one is returned
+    deadline = time.monotonic() + POOL_WAIT_SECONDS
+    delay = 0.005
+    while True:
+        try:
+            return pool.get_connection()
+        except PoolError:
+            if time.monotonic() + delay > deadline:
+                raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+
+def _connect(host, port, batch=False):
+    key = (host, port)
+    if not _breaker_allows(key):
+        return None
+    try:
+        db = _checkout(_get_pool(host, port, batch))
         if db.is_connected():
-            print("Database connection established.")
+            _record_success(key)
             return db
-
+        db.close()
+        _record_failure(key)
+    except PoolError as e:
+        # every pooled connection stayed in use for DB_POOL_WAIT_SECONDS; the server itself is fine
+        print(f"Error connecting to MySQL at {host}:{port}:", e)
     except Error as e:
-        print("Error connecting to MySQL:", e)
+        print(f"Error connecting to MySQL at {host}:{port}:", e)
+        _record_failure(key)
+    return None
+
+
+def _replica_lag(db):
+    cursor = db.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")
+        status = cursor.fetchone()
+    finally:
+        cursor.close()
+
+    if not status:
         return None
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return float(lag) if lag is not None else None
+
+
+def _replica_is_healthy(replica, db):
+    now = time.monotonic()
+    with _health_lock:
+        checked = _replica_health.get(replica)
+    if checked and now - checked[0] < REPLICA_LAG_CHECK_INTERVAL:
+        return checked[1]
+
+    try:
+        lag = _replica_lag(db)
+        # a NULL lag means replication is stopped or broken
+        healthy = lag is not None and lag <= REPLICA_MAX_LAG
+    except Error as e:
+        print(f"Error checking replica lag on {replica[0]}:{replica[1]}:", e)
+        healthy = False
+
+    with _health_lock:
+        _replica_health[replica] = (now, healthy)
+    if not healthy:
+        print(f"Replica {replica[0]}:{replica[1]} is lagging, routing reads to primary")
+    return healthy
+
+
+def mark_write(user_id):
+    if user_id is None:
+        return
+    with _writes_lock:
+        _recent_writes[user_id] = time.monotonic()
+
+
+def _wrote_recently(user_id):
+    if user_id is None:
+        return False
+    with _writes_lock:
+        written_at = _recent_writes.get(user_id)
+        if written_at is None:
+            return False
+        if time.monotonic() - written_at > STICKY_SECONDS:
+            del _recent_writes[user_id]
+            return False
+        return True
+
+
+def get_db(batch=False):
+    host, port = _primary_host()
+    return _connect(host, port, batch)
+
+
+def get_read_db(user_id=None, batch=False):
+    if not REPLICAS or _wrote_recently(user_id):
+        return get_db(batch)
+
+    for _ in range(len(REPLICAS)):
+        replica = next(_replica_cycle)
+        db = _connect(*replica, batch)
+        if db is None:
+            continue
+        if _replica_is_healthy(replica, db):
+            return db
+        db.close()
+
+    return get_db(batch)
+
+
+def shard_ids():
+    return sorted(SHARDS)
+
+
+def is_sharded():
+    return len(SHARDS) > 1
+
+
+def shard_for_id(entity_id):
+    shard = int(entity_id) // SHARD_ID_STRIDE
+    return shard if shard in SHARDS else 0
+
+
+def shard_for_location(location):
+    key = (location or "").strip().lower()
+    if key in REGION_SHARDS:
+        return REGION_SHARDS[key]
+    return _ring[bisect.bisect(_ring_keys, _ring_hash(key)) % len(_ring)][1]
+
+
+def get_shard_db(shard_id, batch=False):
+    if shard_id == 0:
+        return get_db(batch)
+    return _connect(*SHARDS[shard_id], batch)
+
+
+def get_read_shard_db(shard_id, user_id=None, batch=False):
+    # replicas are only configured for shard 0
+    if shard_id == 0:
+        return get_read_db(user_id, batch)
+    return get_shard_db(shard_id, batch)
+
+
+_fan_out_pool = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="shard-fan-out")
+_fan_out_local = threading.local()
+
+
+def _run_shard(fn, shard_id):
+    _fan_out_local.inside = True
+    try:
+        return fn(shard_id)
+    finally:
+        _fan_out_local.inside = False
+
+
+def fan_out(fn, shards=None):
+    # run fn(shard_id) on every shard concurrently and return the results in shard order
+    shards = shard_ids() if shards is None else list(shards)
+    # a fan_out from inside a shard task runs inline, so tasks never wait on tasks queued behind them
+    if len(shards) == 1 or getattr(_fan_out_local, "inside", False):
+        return [fn(shard_id) for shard_id in shards]
+    futures = [_fan_out_pool.submit(_run_shard, fn, shard_id) for shard_id in shards]
+    return [future.result() for future in futures]
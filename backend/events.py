@@ -0,0 +1,24 @@
+import threading
+
+# in-process notifications so modules holding cached lot data can drop it after admin changes
+LOTS_CHANGED = "lots_changed"
+# payload: reservation ids that were created, cancelled, completed or deleted
+RESERVATIONS_CHANGED = "reservations_changed"
+
+_subscribers = {}
+_lock = threading.Lock()
+
+
+def subscribe(topic, callback):
+    with _lock:
+        _subscribers.setdefault(topic, []).append(callback)
+
+
+def publish(topic, payload=None):
+    with _lock:
+        callbacks = list(_subscribers.get(topic, ()))
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"Error handling {topic} event:", e)
@@ -0,0 +1,166 @@
+from repository import get_repository
+from database import shard_for_id
+import events
+from datetime import datetime
+import numpy as np
+import os
+import threading
+import time
+
+HOURS_PER_WEEK = 168
+# datetime64 hour 0 is Thursday 1970-01-01 00:00; shift so bin 0 is Monday 00:00 like datetime.weekday()
+EPOCH_HOUR_OF_WEEK = 3 * 24
+# a reservation left active for days should not smear across the whole week
+MAX_RESERVATION_HOURS = 24
+
+REFRESH_SECONDS = float(os.getenv("FORECAST_REFRESH_SECONDS", "60"))
+REBUILD_SECONDS = float(os.getenv("FORECAST_REBUILD_SECONDS", "3600"))
+
+
+class OccupancyModel:
+    def __init__(self, lot_ids, capacities):
+        self.lot_index = {lot_id: i for i, lot_id in enumerate(lot_ids)}
+        self.capacities = np.asarray(capacities, dtype=np.float64)
+        # reservation-hours per lot and hour-of-week bin, summed over all observed weeks
+        self.booked_hours = np.zeros((len(lot_ids), HOURS_PER_WEEK), dtype=np.float64)
+        # first observed hour per lot, to turn sums into per-week averages
+        self.first_hour = np.full(len(lot_ids), np.iinfo(np.int64).max, dtype=np.int64)
+        # shard -> highest reservation_id added from that shard
+        self.last_reservation_ids = {}
+
+    def add(self, rows):
+        rows = [row for row in rows if row["lot_id"] in self.lot_index]
+        if not rows:
+            return
+
+        lots = np.fromiter((self.lot_index[row["lot_id"]] for row in rows), dtype=np.int64, count=len(rows))
+        starts = np.array([row["start_time"] for row in rows], dtype="datetime64[m]")
+        ends = np.array([row["end_time"] for row in rows], dtype="datetime64[m]")
+
+        start_hours = starts.astype("datetime64[h]").astype(np.int64)
+        end_hours = (ends - np.timedelta64(1, "m")).astype("datetime64[h]").astype(np.int64) + 1
+        spans = np.clip(end_hours - start_hours, 1, MAX_RESERVATION_HOURS)
+
+        # expand every reservation into one entry per hour it touches
+        offsets = np.arange(spans.sum()) - np.repeat(np.cumsum(spans) - spans, spans)
+        hours = np.repeat(start_hours, spans) + offsets
+        bins = np.repeat(lots, spans) * HOURS_PER_WEEK + (hours + EPOCH_HOUR_OF_WEEK) % HOURS_PER_WEEK
+
+        self.booked_hours += np.bincount(bins, minlength=self.booked_hours.size).reshape(self.booked_hours.shape)
+        np.minimum.at(self.first_hour, lots, start_hours)
+        for row in rows:
+            shard = shard_for_id(row["reservation_id"])
+            self.last_reservation_ids[shard] = max(self.last_reservation_ids.get(shard, 0), row["reservation_id"])
+
+    def expected_occupied(self, now_hour):
+        observed = np.where(self.first_hour <= now_hour, now_hour - self.first_hour, 0)
+        weeks = np.maximum(1.0, observed / HOURS_PER_WEEK)
+        return self.booked_hours / weeks[:, None]
+
+
+# (model, expected occupancy array), replaced in one assignment so readers never pair a model
+# with another model's array
+_snapshot = None
+_lock = threading.Lock()
+_last_rebuild = 0.0
+
+
+def _now_hour():
+    return int(np.datetime64(datetime.now(), "h").astype(np.int64))
+
+
+def rebuild():
+    global _snapshot, _last_rebuild
+    repo = get_repository()
+    lots = repo.list_lots()
+    model = OccupancyModel([lot["lot_id"] for lot in lots], [lot["total_spots"] or 0 for lot in lots])
+    model.add(repo.reservation_history(include_archived=True))
+
+    expected = model.expected_occupied(_now_hour())
+    with _lock:
+        _snapshot = (model, expected)
+        _last_rebuild = time.monotonic()
+
+
+def refresh():
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or time.monotonic() - _last_rebuild > REBUILD_SECONDS:
+        # full rebuilds also pick up cancellations, new lots and capacity changes
+        rebuild()
+        return
+
+    model = snapshot[0]
+    rows = get_repository().reservation_history(since_ids=dict(model.last_reservation_ids))
+    with _lock:
+        if _snapshot is not snapshot:
+            # a rebuild replaced the model meanwhile
+            return
+        model.add(rows)
+        _snapshot = (model, model.expected_occupied(_now_hour()))
+
+
+def invalidate(lot_ids=None):
+    # new lots and capacity changes only show up after a full rebuild
+    global _last_rebuild
+    _last_rebuild = float("-inf")
+
+
+events.subscribe(events.LOTS_CHANGED, invalidate)
+
+
+def _refresh_loop():
+    while True:
+        try:
+            refresh()
+        except Exception as e:
+            print("Error refreshing occupancy forecast:", e)
+        time.sleep(REFRESH_SECONDS)
+
+
+def start():
+    threading.Thread(target=_refresh_loop, name="occupancy-forecast", daemon=True).start()
+
+
+def hour_of_week(at):
+    return at.weekday() * 24 + at.hour
+
+
+def predict(lot_id, at):
+    snapshot = _snapshot
+    if snapshot is None or lot_id not in snapshot[0].lot_index:
+        return None
+    model, expected = snapshot
+
+    row = model.lot_index[lot_id]
+    how = hour_of_week(at)
+    capacity = float(model.capacities[row])
+    occupied = min(capacity, float(expected[row, how]))
+    return {
+        "lot_id": lot_id,
+        "at": at.isoformat(),
+        "hour_of_week": how,
+        "total_spots": int(capacity),
+        "expected_occupied": round(occupied, 2),
+        "predicted_available": int(capacity - round(occupied)),
+        "predicted_occupancy_rate": round(occupied / capacity * 100, 2) if capacity > 0 else 0,
+    }
+
+
+def weekly_profile(lot_id):
+    snapshot = _snapshot
+    if snapshot is None or lot_id not in snapshot[0].lot_index:
+        return None
+    model, expected = snapshot
+
+    row = model.lot_index[lot_id]
+    capacity = float(model.capacities[row])
+    occupied = np.minimum(expected[row], capacity)
+    peak = int(np.argmax(occupied))
+    return {
+        "lot_id": lot_id,
+        "total_spots": int(capacity),
+        "expected_occupied": np.round(occupied, 2).tolist(),
+        "peak_hour_of_week": peak,
+        "peak_occupancy_rate": round(float(occupied[peak]) / capacity * 100, 2) if capacity > 0 else 0,
+    }
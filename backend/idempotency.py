@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import threading
+import time
+
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+# idempotency_keys.idem_key is VARCHAR(128)
+MAX_KEY_LENGTH = 128
+
+
+class KeyReusedError(Exception):
+    pass
+
+
+class IdempotencyStore:
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, request_hash, response):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), request_hash, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_store = IdempotencyStore(MAX_ENTRIES, TTL_SECONDS)
+
+
+def fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+
+
+def _check(request_hash, stored_hash):
+    if request_hash != stored_hash:
+        raise KeyReusedError("Idempotency-Key was already used with a different request")
+
+
+def get_cached(key, request_hash):
+    entry = _store.get(key)
+    if entry is None:
+        return None
+    _check(request_hash, entry[0])
+    return entry[1]
+
+
+def remember(key, request_hash, response):
+    _store.put(key, request_hash, response)
+
+
+def lookup(tx, key, request_hash):
+    row = tx.get_idempotency_record(key, TTL_SECONDS)
+    if not row or row["response"] is None:
+        return None
+
+    _check(request_hash, row["request_hash"])
+    response = json.loads(row["response"])
+    remember(key, request_hash, response)
+    return response
+
+
+def claim(tx, key, user_id, request_hash):
+    return tx.claim_idempotency_key(key, user_id, request_hash, TTL_SECONDS)
+
+
+def complete(tx, key, response):
+    tx.complete_idempotency_key(key, json.dumps(response))
@@ -0,0 +1,194 @@
+from database import get_read_shard_db, fan_out, shard_for_id
+from repository import MySQLRepository, ReservationError
+from sqlite_repository import SQLiteRepository
+import argparse
+import idempotency
+import os
+import socket
+import time
+
+# table -> columns copied from MySQL into the kiosk's embedded database
+REFERENCE_TABLES = {
+    "parking_lots": ["lot_id", "lot_name", "location", "total_spots", "available_spots", "hourly_rate", "status"],
+    "parking_spots": ["spot_id", "lot_id", "spot_number", "is_occupied"],
+    "users": ["user_id", "name", "email", "password_hash", "role", "created_at"],
+    "vehicles": ["vehicle_id", "user_id", "license_plate", "vehicle_type", "created_at"],
+}
+# users and vehicles only live on shard 0; lots and spots are spread over all shards
+SHARDED_TABLES = {"parking_lots", "parking_spots"}
+
+
+def _push_reservation(remote, key, reservation):
+    # the idempotency key makes a re-push after a crash between the upstream commit and the
+    # local sync_status update replay the upstream reservation instead of booking it twice
+    request_hash = idempotency.fingerprint(
+        reservation["user_id"], reservation["lot_id"], reservation["start_time"], reservation["end_time"]
+    )
+    tx = remote.begin(shard_for_id(reservation["lot_id"]))
+    try:
+        if not idempotency.claim(tx, key, reservation["user_id"], request_hash):
+            tx.rollback()
+            replay = idempotency.lookup(tx, key, request_hash)
+            # None while an earlier push of this reservation is still committing; retried next sync
+            return replay and replay["reservation_id"]
+
+        upstream_id, _ = tx.make_reservation(
+            reservation["user_id"], reservation["lot_id"],
+            reservation["start_time"], reservation["end_time"]
+        )
+        if reservation["status"] != "active":
+            tx.set_reservation_status(upstream_id, reservation["status"])
+        idempotency.complete(tx, key, {"reservation_id": upstream_id})
+        tx.commit()
+        return upstream_id
+    except ReservationError:
+        tx.rollback()
+        raise
+    finally:
+        tx.close()
+
+
+def _push_status(remote, reservation):
+    tx = remote.begin(shard_for_id(reservation["lot_id"]))
+    try:
+        # setting the same status again is a no-op upstream, so a re-push is harmless
+        tx.set_reservation_status(reservation["upstream_reservation_id"], reservation["status"])
+        tx.commit()
+    finally:
+        tx.close()
+
+
+def push_reservations(local, remote, kiosk_id):
+    conn = local.connect()
+    try:
+        pending = conn.execute("""
+            SELECT reservation_id, user_id, lot_id, start_time, end_time, status
+            FROM reservations
+            WHERE sync_status = 'pending'
+            ORDER BY reservation_id
+        """).fetchall()
+
+        pushed = rejected = 0
+        for reservation in pending:
+            if reservation["status"] == "cancelled":
+                # cancelled before it ever reached MySQL; there is nothing to book or cancel upstream
+                conn.execute(
+                    "UPDATE reservations SET sync_status = 'synced', synced_status = status WHERE reservation_id = ?",
+                    (reservation["reservation_id"],),
+                )
+                continue
+
+            key = f"kiosk:{kiosk_id}:{reservation['reservation_id']}"
+            try:
+                upstream_id = _push_reservation(remote, key, reservation)
+            except ReservationError as e:
+                print(f"Upstream rejected reservation {reservation['reservation_id']}: {e}")
+                conn.execute(
+                    "UPDATE reservations SET sync_status = 'rejected' WHERE reservation_id = ?",
+                    (reservation["reservation_id"],),
+                )
+                rejected += 1
+                continue
+            if upstream_id is None:
+                continue
+
+            conn.execute("""
+                UPDATE reservations SET sync_status = 'synced', upstream_reservation_id = ?, synced_status = ?
+                WHERE reservation_id = ?
+            """, (upstream_id, reservation["status"], reservation["reservation_id"]))
+            pushed += 1
+
+        # cancellations, completions and check-outs made on the kiosk after the booking was pushed
+        changed = conn.execute("""
+            SELECT reservation_id, lot_id, status, upstream_reservation_id
+            FROM reservations
+            WHERE sync_status = 'synced' AND upstream_reservation_id IS NOT NULL
+              AND synced_status IS NOT status
+            ORDER BY reservation_id
+        """).fetchall()
+        for reservation in changed:
+            _push_status(remote, reservation)
+            conn.execute(
+                "UPDATE reservations SET synced_status = ? WHERE reservation_id = ?",
+                (reservation["status"], reservation["reservation_id"]),
+            )
+
+        return pushed, rejected, len(changed)
+    finally:
+        conn.close()
+
+
+def read_shard(shard_id):
+    db = get_read_shard_db(shard_id)
+    if not db:
+        raise ConnectionError("Database connection failed")
+
+    cursor = db.cursor()
+    snapshots = {}
+    try:
+        for table, columns in REFERENCE_TABLES.items():
+            if shard_id != 0 and table not in SHARDED_TABLES:
+                continue
+            cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            snapshots[table] = cursor.fetchall()
+    finally:
+        cursor.close()
+        db.close()
+    return snapshots
+
+
+def pull_reference_data(local):
+    snapshots = {table: [] for table in REFERENCE_TABLES}
+    for shard_snapshots in fan_out(read_shard):
+        for table, rows in shard_snapshots.items():
+            snapshots[table].extend(rows)
+
+    conn = local.connect()
+    try:
+        conn.execute("PRAGMA foreign_keys=OFF")
+        conn.execute("BEGIN IMMEDIATE")
+        for table, columns in REFERENCE_TABLES.items():
+            placeholders = ", ".join(["?"] * len(columns))
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                snapshots[table],
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    return {table: len(rows) for table, rows in snapshots.items()}
+
+
+def sync_upstream(local, remote, kiosk_id):
+    # push first so the pulled lot counts already include this kiosk's bookings
+    pushed, rejected, updated = push_reservations(local, remote, kiosk_id)
+    counts = pull_reference_data(local)
+    print(f"Pushed {pushed} reservations ({rejected} rejected) and {updated} status changes, pulled {counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync a kiosk's embedded SQLite database with the MySQL primary")
+    parser.add_argument("--sqlite-path", default=os.getenv("SQLITE_PATH", "parking.db"))
+    parser.add_argument(
+        "--kiosk-id", default=os.getenv("KIOSK_ID", socket.gethostname()),
+        help="unique per kiosk; part of the idempotency key of every pushed reservation"
+    )
+    parser.add_argument("--interval", type=float, default=0, help="seconds between syncs; 0 syncs once")
+    args = parser.parse_args()
+
+    local = SQLiteRepository(args.sqlite_path)
+    remote = MySQLRepository()
+
+    while True:
+        try:
+            sync_upstream(local, remote, args.kiosk_id)
+        except Exception as e:
+            print("Sync failed:", e)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
@@ -0,0 +1,29 @@
+from datetime import datetime
+import threading
+
+# the last successful lot listing, lot rows and lot statuses, served with "stale": true
+# while the database is unreachable or its circuit breaker is open
+_entries = {}
+_lock = threading.Lock()
+
+
+def put(key, value):
+    with _lock:
+        _entries[key] = (value, datetime.now())
+
+
+def put_lots(lots):
+    saved_at = datetime.now()
+    with _lock:
+        _entries["lots"] = (lots, saved_at)
+        for lot in lots:
+            _entries[("lot", lot["lot_id"])] = (lot, saved_at)
+
+
+def get(key):
+    with _lock:
+        return _entries.get(key)
+
+
+def stale(payload, saved_at):
+    return dict(payload, stale=True, as_of=saved_at.isoformat())
@@ -1,11 +1,69 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from routes import auth
 from routes import parking
 from routes import admin
+from routes import sensors
+from routes import gate
+import capabilities
+import forecast
+import plate_index
+import profiling
+import rate_limit
+import search_index
+import sensor_buffer
+import time
+import waitlist
 
 app = FastAPI(title="Smart Parking System API", version="1.0.0")
 
+# registered first so it runs inside admission control and only sees admitted requests
+@app.middleware("http")
+async def request_profiling(request: Request, call_next):
+    if not profiling.should_profile(request.headers.get("x-profile")):
+        return await call_next(request)
+
+    capture, token = profiling.begin()
+    started = time.perf_counter()
+    response = await call_next(request)
+    profile_id = profiling.finish(
+        capture, token, request.method, request.url.path, response.status_code,
+        (time.perf_counter() - started) * 1000
+    )
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = str(profile_id)
+    return response
+
+# registered before CORSMiddleware so CORS stays outermost and 429/503 responses keep their CORS headers
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    # X-User-Id is not authenticated, so budgets are per client IP only
+    client_keys = [request.client.host if request.client else "unknown"]
+
+    retry_after = rate_limit.limiter.check(request.method, request.url.path, client_keys)
+    if retry_after:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    if not rate_limit.uses_connection_pool(request.method, request.url.path):
+        return await call_next(request)
+
+    if not rate_limit.concurrency.try_acquire():
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is busy, please retry shortly"},
+            headers={"Retry-After": "1"},
+        )
+
+    try:
+        return await call_next(request)
+    finally:
+        rate_limit.concurrency.release()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -17,3 +75,14 @@ app.add_middleware(
 app.include_router(auth.router)
 app.include_router(parking.router)
 app.include_router(admin.router)
+app.include_router(sensors.router)
+app.include_router(gate.router)
+
+@app.on_event("startup")
+def start_background_jobs():
+    capabilities.refresh()
+    forecast.start()
+    waitlist.start()
+    sensor_buffer.start()
+    plate_index.start()
+    search_index.start()
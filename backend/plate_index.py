@@ -0,0 +1,214 @@
+from repository import get_repository
+from database import shard_for_id
+from datetime import datetime, timedelta
+import events
+import os
+import queue
+import re
+import threading
+import time
+
+# other API processes write reservations too, so the index is also rebuilt periodically
+REBUILD_SECONDS = float(os.getenv("PLATE_INDEX_REBUILD_SECONDS", "60"))
+EARLY_ENTRY = timedelta(minutes=float(os.getenv("GATE_EARLY_ENTRY_MINUTES", "15")))
+CHECK_IN_RETRY_SECONDS = float(os.getenv("GATE_CHECK_IN_RETRY_SECONDS", "1"))
+
+
+class IndexNotReadyError(Exception):
+    pass
+
+
+def normalize(plate):
+    return re.sub(r"[^A-Z0-9]", "", plate.upper())
+
+
+def _entry(row):
+    return {
+        "reservation_id": row["reservation_id"],
+        "user_id": row["user_id"],
+        "lot_id": row["lot_id"],
+        "status": row["status"],
+        "start_time": row["start_time"],
+        "end_time": row["end_time"],
+        "checked_in_at": row["checked_in_at"],
+    }
+
+
+class PlateIndex:
+    def __init__(self):
+        # normalized plate -> {reservation_id: entry}
+        self._by_plate = {}
+        # reservation_id -> plates of the owner's vehicles
+        self._plates = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    def _add(self, by_plate, plates, row):
+        plate = normalize(row["license_plate"])
+        by_plate.setdefault(plate, {})[row["reservation_id"]] = _entry(row)
+        plates.setdefault(row["reservation_id"], set()).add(plate)
+
+    def _remove(self, reservation_id):
+        for plate in self._plates.pop(reservation_id, ()):
+            entries = self._by_plate.get(plate)
+            if entries is not None:
+                entries.pop(reservation_id, None)
+                if not entries:
+                    del self._by_plate[plate]
+
+    def replace(self, rows):
+        by_plate, plates = {}, {}
+        for row in rows:
+            self._add(by_plate, plates, row)
+        with self._lock:
+            self._by_plate, self._plates = by_plate, plates
+            self.loaded = True
+
+    def update(self, reservation_ids, rows):
+        # rows are the current state of reservation_ids; ids without a row left the index
+        with self._lock:
+            for reservation_id in reservation_ids:
+                self._remove(reservation_id)
+            for row in rows:
+                self._add(self._by_plate, self._plates, row)
+
+    def find_entry(self, plate, lot_id, now):
+        with self._lock:
+            entries = list(self._by_plate.get(plate, {}).values())
+        valid = [
+            entry for entry in entries
+            if entry["lot_id"] == lot_id
+            and entry["status"] == "active"
+            and entry["start_time"] - EARLY_ENTRY <= now <= entry["end_time"]
+        ]
+        # a car already inside keeps matching its own booking on repeated camera reads
+        valid.sort(key=lambda entry: (entry["checked_in_at"] is None, entry["start_time"]))
+        return valid[0] if valid else None
+
+    def find_exit(self, plate, lot_id):
+        with self._lock:
+            entries = list(self._by_plate.get(plate, {}).values())
+        inside = [entry for entry in entries if entry["lot_id"] == lot_id and entry["checked_in_at"] is not None]
+        inside.sort(key=lambda entry: entry["checked_in_at"])
+        return inside[0] if inside else None
+
+    def mark_checked_in(self, reservation_id, at):
+        with self._lock:
+            for plate in self._plates.get(reservation_id, ()):
+                entry = self._by_plate.get(plate, {}).get(reservation_id)
+                if entry is not None:
+                    entry["checked_in_at"] = at
+
+    def size(self):
+        with self._lock:
+            return {"plates": len(self._by_plate), "reservations": len(self._plates)}
+
+
+index = PlateIndex()
+
+# check-ins the barrier has already allowed but that are not in the database yet: reservation_id -> time
+_unsaved = {}
+_unsaved_lock = threading.Lock()
+_check_ins = queue.Queue()
+
+
+def _reapply_unsaved():
+    # a rebuild or refresh read from the database may predate a check-in that is still queued
+    with _unsaved_lock:
+        unsaved = list(_unsaved.items())
+    for reservation_id, at in unsaved:
+        index.mark_checked_in(reservation_id, at)
+
+
+def rebuild():
+    index.replace(get_repository().gate_reservations(datetime.now()))
+    _reapply_unsaved()
+
+
+def ensure_loaded():
+    # the index is loaded by the background thread, never on a request thread
+    if not index.loaded:
+        raise IndexNotReadyError("Plate index is still loading")
+
+
+def refresh(reservation_ids):
+    reservation_ids = [reservation_id for reservation_id in reservation_ids if reservation_id]
+    if not reservation_ids or not index.loaded:
+        return
+    index.update(reservation_ids, get_repository().gate_reservations(datetime.now(), reservation_ids))
+    _reapply_unsaved()
+
+
+def check_in(reservation_id, at):
+    # the barrier opens on the index; the database write happens on the check-in thread
+    index.mark_checked_in(reservation_id, at)
+    with _unsaved_lock:
+        _unsaved[reservation_id] = at
+    _check_ins.put(reservation_id)
+
+
+def unsaved_check_in(reservation_id):
+    with _unsaved_lock:
+        return _unsaved.get(reservation_id)
+
+
+def _save_check_in(reservation_id):
+    with _unsaved_lock:
+        at = _unsaved.get(reservation_id)
+    if at is None:
+        # already written, e.g. by a check-out that got there first
+        return
+
+    tx = get_repository().begin(shard_for_id(reservation_id))
+    try:
+        checked_in = tx.check_in_reservation(reservation_id, at)
+        tx.commit()
+    except Exception:
+        tx.rollback()
+        raise
+    finally:
+        tx.close()
+
+    check_in_saved(reservation_id)
+    if not checked_in:
+        # cancelled or ended between the index read and the write; the car is already through
+        print(f"Check-in of reservation {reservation_id} at {at} was not recorded: reservation no longer active")
+        refresh([reservation_id])
+
+
+def check_in_saved(reservation_id):
+    with _unsaved_lock:
+        _unsaved.pop(reservation_id, None)
+
+
+def _check_in_loop():
+    while True:
+        reservation_id = _check_ins.get()
+        try:
+            _save_check_in(reservation_id)
+        except Exception as e:
+            print(f"Error recording check-in of reservation {reservation_id}:", e)
+            time.sleep(CHECK_IN_RETRY_SECONDS)
+            _check_ins.put(reservation_id)
+
+
+def _on_reservations_changed(reservation_ids):
+    refresh(reservation_ids or [])
+
+
+events.subscribe(events.RESERVATIONS_CHANGED, _on_reservations_changed)
+
+
+def _rebuild_loop():
+    while True:
+        try:
+            rebuild()
+        except Exception as e:
+            print("Error rebuilding plate index:", e)
+        # until the first load succeeds the gates answer 503, so retry soon
+        time.sleep(REBUILD_SECONDS if index.loaded else min(REBUILD_SECONDS, 5))
+
+
+def start():
+    threading.Thread(target=_rebuild_loop, name="plate-index", daemon=True).start()
+    threading.Thread(target=_check_in_loop, name="gate-check-in", daemon=True).start()
@@ -0,0 +1,117 @@
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from fastapi.routing import APIRoute
+import cProfile
+import functools
+import inspect
+import io
+import itertools
+import os
+import pstats
+import random
+import threading
+
+# off unless an admin enables it (PUT /admin/profiling) or PROFILE_SAMPLE_RATE is set
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# requests sending "X-Profile: <token>" are always profiled; unset disables the header
+HEADER_TOKEN = os.getenv("PROFILE_TOKEN")
+MAX_PROFILES = int(os.getenv("PROFILE_MAX_KEPT", "50"))
+TOP_FUNCTIONS = 30
+
+# set by the middleware for requests that are being profiled; the route wrapper stores the profiler in it
+_capture = ContextVar("profile_capture", default=None)
+_profiles = deque(maxlen=MAX_PROFILES)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_settings = {"sample_rate": SAMPLE_RATE}
+
+
+def configure(sample_rate):
+    with _lock:
+        _settings["sample_rate"] = max(0.0, min(1.0, sample_rate))
+        return dict(_settings)
+
+
+def settings():
+    with _lock:
+        return dict(_settings, header_enabled=HEADER_TOKEN is not None, kept=len(_profiles), max_kept=MAX_PROFILES)
+
+
+def should_profile(header_value):
+    if HEADER_TOKEN is not None and header_value == HEADER_TOKEN:
+        return True
+    rate = _settings["sample_rate"]
+    return rate > 0 and random.random() < rate
+
+
+def begin():
+    capture = {}
+    return capture, _capture.set(capture)
+
+
+def finish(capture, token, method, path, status_code, duration_ms):
+    _capture.reset(token)
+    profiler = capture.get("profiler")
+    if profiler is None:
+        # the request never reached a profiled route
+        return None
+
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    with _lock:
+        profile_id = next(_ids)
+        _profiles.append({
+            "profile_id": profile_id,
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration_ms": round(duration_ms, 2),
+            "total_calls": stats.total_calls,
+            "captured_at": datetime.now().isoformat(),
+            "report": output.getvalue(),
+        })
+    return profile_id
+
+
+def list_profiles():
+    with _lock:
+        return [{key: value for key, value in profile.items() if key != "report"} for profile in reversed(_profiles)]
+
+
+def get_profile(profile_id):
+    with _lock:
+        for profile in _profiles:
+            if profile["profile_id"] == profile_id:
+                return profile
+    return None
+
+
+def _profiled(endpoint):
+    # sync handlers run on a worker thread, and cProfile only sees the thread it was enabled on,
+    # so the profiler is started inside the handler call rather than in the middleware
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        capture = _capture.get()
+        if capture is None:
+            return endpoint(*args, **kwargs)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profiler.disable()
+            capture["profiler"] = profiler
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _profiled(endpoint), **kwargs)
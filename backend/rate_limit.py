@@ -0,0 +1,150 @@
+from collections import Counter
+from database import POOL_SIZE
+import math
+import os
+import threading
+import time
+
+# (method, path prefix, bucket capacity, tokens refilled per second), first match wins
+ROUTE_BUDGETS = [
+    ("POST", "/auth/login", 5, 5 / 60),
+    ("POST", "/parking/book", 10, 1),
+    # typeahead sends a request per keystroke
+    ("GET", "/parking/lots/search", 60, 20),
+    ("GET", "/parking/lots", 30, 10),
+    ("GET", "/parking/bookings", 20, 5),
+    ("*", "/admin", 60, 20),
+    # sensor gateways post batches several times a second
+    ("POST", "/sensors", 200, 50),
+    # one gate controller reads every car in the queue
+    ("POST", "/gate", 120, 20),
+]
+DEFAULT_BUDGET = (60, 20)
+
+MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+BUCKET_IDLE_SECONDS = 600
+# shed load before requests start queueing on the primary's connection pool
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT_REQUESTS", str(POOL_SIZE)))
+# decided from in-memory state (plate index, sensor buffer, search index, forecast) rather than queued on
+# the pool, so they do not count against MAX_IN_FLIGHT and barriers keep opening during booking bursts
+# check-out is left out: it completes the reservation and allocates the waitlist in a transaction
+IN_MEMORY_ROUTES = [
+    ("POST", "/gate/check-in"),
+    ("POST", "/sensors"),
+    ("GET", "/parking/lots/search"),
+    ("GET", "/admin/search"),
+]
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated")
+
+    def __init__(self, capacity, refill_rate, now):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+
+class RateLimiter:
+    def __init__(self, budgets, default_budget):
+        self.budgets = budgets
+        self.default_budget = default_budget
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.allowed = Counter()
+        self.throttled = Counter()
+
+    def _budget(self, method, path):
+        for budget_method, prefix, capacity, refill_rate in self.budgets:
+            if path.startswith(prefix) and budget_method in ("*", method):
+                return f"{budget_method} {prefix}", capacity, refill_rate
+        return "default", *self.default_budget
+
+    def _prune(self, now):
+        idle = [key for key, bucket in self._buckets.items() if now - bucket.updated > BUCKET_IDLE_SECONDS]
+        for key in idle:
+            del self._buckets[key]
+
+    def check(self, method, path, client_keys):
+        route, capacity, refill_rate = self._budget(method, path)
+        now = time.monotonic()
+        retry_after = 0
+
+        with self._lock:
+            if len(self._buckets) > MAX_BUCKETS:
+                self._prune(now)
+            for client in client_keys:
+                key = (route, client)
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(capacity, refill_rate, now)
+                retry_after = max(retry_after, bucket.take(now))
+
+            if retry_after:
+                self.throttled[route] += 1
+            else:
+                self.allowed[route] += 1
+
+        return math.ceil(retry_after) if retry_after else 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "buckets": len(self._buckets),
+                "allowed": dict(self.allowed),
+                "throttled": dict(self.throttled),
+            }
+
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "max_in_flight": self.max_in_flight,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "shed": self.shed,
+            }
+
+
+limiter = RateLimiter(ROUTE_BUDGETS, DEFAULT_BUDGET)
+concurrency = ConcurrencyLimiter(MAX_IN_FLIGHT)
+
+
+def uses_connection_pool(method, path):
+    if method == "GET" and path.endswith("/forecast"):
+        return False
+    return not any(method == route_method and path.startswith(prefix) for route_method, prefix in IN_MEMORY_ROUTES)
+
+
+def stats():
+    return {"rate_limits": limiter.snapshot(), "concurrency": concurrency.snapshot()}
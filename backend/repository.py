@@ -0,0 +1,738 @@
+from mysql.connector import DatabaseError, IntegrityError, InterfaceError, OperationalError
+from database import get_db, report_failure, get_shard_db, get_read_shard_db, fan_out, shard_ids, shard_for_id, is_sharded
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import timedelta
+import capabilities
+import os
+import threading
+
+# a car still inside this long after its booking ended is assumed to have left unseen by the exit camera
+GATE_EXIT_WINDOW = timedelta(hours=float(os.getenv("GATE_EXIT_WINDOW_HOURS", "24")))
+
+LOT_COLUMNS = "lot_id, lot_name, location, total_spots, available_spots, hourly_rate, status"
+
+
+def lot_columns():
+    # sensor_ingestion.sql adds what the spot sensors count next to the reservation-based counts
+    if capabilities.has("parking_lots.sensor_occupied_spots"):
+        return LOT_COLUMNS + ", sensor_occupied_spots"
+    return LOT_COLUMNS
+
+
+USER_BOOKINGS_VIEW_QUERY = """
+    SELECT * FROM v_user_bookings
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+"""
+
+USER_BOOKINGS_QUERY = """
+    SELECT
+        r.reservation_id,
+        r.user_id,
+        u.name as user_name,
+        u.email,
+        r.lot_id,
+        p.lot_name,
+        p.location,
+        r.start_time,
+        r.end_time,
+        TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
+        r.total_cost,
+        r.status,
+        r.created_at
+    FROM reservations r
+    JOIN users u ON r.user_id = u.user_id
+    JOIN parking_lots p ON r.lot_id = p.lot_id
+    WHERE r.user_id = %s
+    ORDER BY r.created_at DESC
+"""
+
+ARCHIVED_USER_BOOKINGS_QUERY = """
+    SELECT
+        a.reservation_id,
+        a.user_id,
+        u.name as user_name,
+        u.email,
+        a.lot_id,
+        p.lot_name,
+        p.location,
+        a.start_time,
+        a.end_time,
+        TIMESTAMPDIFF(HOUR, a.start_time, a.end_time) as duration_hours,
+        a.total_cost,
+        a.status,
+        a.created_at
+    FROM reservations_archive a
+    JOIN users u ON a.user_id = u.user_id
+    LEFT JOIN parking_lots p ON a.lot_id = p.lot_id
+    WHERE a.user_id = %s
+    ORDER BY a.created_at DESC
+"""
+
+RESERVATION_HISTORY_QUERY = """
+    SELECT reservation_id, lot_id, start_time, end_time
+    FROM reservations
+    WHERE reservation_id > %s AND status != 'cancelled'
+"""
+
+ARCHIVED_RESERVATION_HISTORY_QUERY = """
+    SELECT reservation_id, lot_id, start_time, end_time
+    FROM reservations_archive
+    WHERE status != 'cancelled'
+"""
+
+# reservations a gate may need to recognise: bookings that can still be used, and cars
+# still inside after the expiry job completed their booking
+GATE_RESERVATIONS_QUERY = """
+    SELECT v.license_plate, r.reservation_id, r.user_id, r.lot_id, r.status,
+           r.start_time, r.end_time, r.checked_in_at
+    FROM reservations r
+    JOIN vehicles v ON v.user_id = r.user_id
+    WHERE (
+        (r.status = 'active' AND r.end_time >= %s)
+        OR (r.status = 'completed' AND r.checked_in_at IS NOT NULL AND r.checked_out_at IS NULL AND r.end_time >= %s)
+    )
+"""
+
+# users and vehicles only live on shard 0, so queries on other shards leave them out and
+# the rows are completed from shard 0
+SHARD_USER_BOOKINGS_QUERY = """
+    SELECT
+        r.reservation_id,
+        r.user_id,
+        r.lot_id,
+        p.lot_name,
+        p.location,
+        r.start_time,
+        r.end_time,
+        TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
+        r.total_cost,
+        r.status,
+        r.created_at
+    FROM {table} r
+    LEFT JOIN parking_lots p ON r.lot_id = p.lot_id
+    WHERE r.user_id = %s
+    ORDER BY r.created_at DESC
+"""
+
+SHARD_GATE_RESERVATIONS_QUERY = """
+    SELECT r.reservation_id, r.user_id, r.lot_id, r.status, r.start_time, r.end_time, r.checked_in_at
+    FROM reservations r
+    WHERE (
+        (r.status = 'active' AND r.end_time >= %s)
+        OR (r.status = 'completed' AND r.checked_in_at IS NOT NULL AND r.checked_out_at IS NULL AND r.end_time >= %s)
+    )
+"""
+
+# used when advanced_database_features.sql has not been applied; same results as the functions
+LOT_COST_QUERY = """
+    SELECT CEIL(TIMESTAMPDIFF(MINUTE, %s, %s) / 60.0) * hourly_rate as cost
+    FROM parking_lots
+    WHERE lot_id = %s
+"""
+
+LOT_STATUS_QUERY = """
+    SELECT
+        CASE
+            WHEN status = 'closed' THEN 'closed'
+            WHEN available_spots <= 0 THEN 'full'
+            ELSE 'available'
+        END as status,
+        IFNULL(available_spots, 0) as available_spots
+    FROM parking_lots
+    WHERE lot_id = %s
+"""
+
+
+class DatabaseUnavailableError(Exception):
+    pass
+
+
+class ReservationError(Exception):
+    pass
+
+
+class LotFullError(ReservationError):
+    pass
+
+
+class ParkingRepository(ABC):
+    @abstractmethod
+    def list_lots(self, primary=False):
+        # primary=True skips the replicas, for callers that must see a write that just committed
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_lot(self, lot_id, primary=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_lots(self, lot_ids, primary=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def calculate_cost(self, lot_id, start_time, end_time):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lot_status(self, lot_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_bookings(self, user_id, include_archived=False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_by_email(self, email):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_users(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def reservation_history(self, since_ids=None, include_archived=False):
+        # since_ids: shard -> last reservation_id already seen on that shard
+        raise NotImplementedError
+
+    @abstractmethod
+    def user_waitlist(self, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def gate_reservations(self, now, reservation_ids=None):
+        raise NotImplementedError
+
+    def shard_ids(self):
+        return [0]
+
+    def user_shards(self, user_id):
+        return [0]
+
+    @abstractmethod
+    def begin(self, shard_id=0):
+        raise NotImplementedError
+
+
+class ParkingTransaction(ABC):
+    @abstractmethod
+    def make_reservation(self, user_id, lot_id, start_time, end_time):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_reservation(self, reservation_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_reservation_status(self, reservation_id, status):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_reservation(self, reservation_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ended_reservations(self, now):
+        raise NotImplementedError
+
+    @abstractmethod
+    def check_in_reservation(self, reservation_id, at):
+        raise NotImplementedError
+
+    @abstractmethod
+    def check_out_reservation(self, reservation_id, at):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_waitlist_entry(self, user_id, lot_id, start_time, end_time, priority=0):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_waitlist_entry(self, user_id, lot_id, start_time, end_time):
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_waiting(self, lot_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def waiting_entries(self, lot_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def lots_to_allocate(self):
+        # open lots with free spots and waiting entries, with their free spot count
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_waitlist_status(self, waitlist_id, status, from_status):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_waitlist_entry(self, waitlist_id, reservation_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_idempotency_record(self, key, ttl_seconds):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_idempotency_key(self, key, user_id, request_hash, ttl_seconds):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete_idempotency_key(self, key, response_json):
+        raise NotImplementedError
+
+    @abstractmethod
+    def commit(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def rollback(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def close(self):
+        raise NotImplementedError
+
+
+# (user_id, shard) pairs already written to user_shards by this process, least recently used first;
+# forgetting a pair only costs one more INSERT IGNORE
+_indexed_user_shards = OrderedDict()
+_indexed_lock = threading.Lock()
+USER_SHARD_CACHE_SIZE = int(os.getenv("USER_SHARD_CACHE_SIZE", "100000"))
+
+
+def _index_user_shard(user_id, shard_id):
+    # user_shards on shard 0 lists the other shards holding a user's reservations. It is written
+    # before the booking commits, so it may name a shard without bookings but never misses one.
+    with _indexed_lock:
+        if (user_id, shard_id) in _indexed_user_shards:
+            _indexed_user_shards.move_to_end((user_id, shard_id))
+            return
+    db = get_db()
+    if not db:
+        raise DatabaseUnavailableError("Database connection failed")
+    cursor = db.cursor()
+    try:
+        cursor.execute("INSERT IGNORE INTO user_shards (user_id, shard_id) VALUES (%s, %s)", (user_id, shard_id))
+        db.commit()
+    finally:
+        cursor.close()
+        db.close()
+    with _indexed_lock:
+        _indexed_user_shards[(user_id, shard_id)] = True
+        while len(_indexed_user_shards) > USER_SHARD_CACHE_SIZE:
+            _indexed_user_shards.popitem(last=False)
+
+
+class MySQLTransaction(ParkingTransaction):
+    def __init__(self, db, shard_id=0):
+        self.db = db
+        self.shard_id = shard_id
+        self.cursor = db.cursor(dictionary=True)
+
+    def make_reservation(self, user_id, lot_id, start_time, end_time):
+        if shard_for_id(lot_id) != self.shard_id:
+            raise ReservationError("Parking lot not found")
+        if self.shard_id != 0:
+            _index_user_shard(user_id, self.shard_id)
+
+        cursor = self.db.cursor()
+        try:
+            result = cursor.callproc("make_reservation1", [user_id, lot_id, start_time, end_time, 0])
+            cursor.execute("SELECT LAST_INSERT_ID()")
+            return cursor.fetchone()[0], float(result[4])
+        except DatabaseError as e:
+            # make_reservation1 reports business rule violations with SIGNAL SQLSTATE '45000'
+            if e.sqlstate == "45000":
+                if e.msg == "No parking spots available":
+                    raise LotFullError(e.msg)
+                raise ReservationError(e.msg)
+            raise
+        finally:
+            cursor.close()
+
+    def get_reservation(self, reservation_id):
+        self.cursor.execute("""
+            SELECT reservation_id, user_id, lot_id, status, start_time, end_time
+            FROM reservations
+            WHERE reservation_id = %s
+        """, (reservation_id,))
+        return self.cursor.fetchone()
+
+    def set_reservation_status(self, reservation_id, status):
+        # after_reservation_update releases the spot when an active reservation ends
+        self.cursor.execute("""
+            UPDATE reservations
+            SET status = %s
+            WHERE reservation_id = %s
+        """, (status, reservation_id))
+
+    def delete_reservation(self, reservation_id):
+        # after_reservation_delete releases the spot of an active reservation
+        self.cursor.execute("DELETE FROM reservations WHERE reservation_id = %s", (reservation_id,))
+
+    def ended_reservations(self, now):
+        self.cursor.execute("""
+            SELECT reservation_id, user_id, lot_id
+            FROM reservations
+            WHERE status = 'active' AND end_time <= %s
+            FOR UPDATE
+        """, (now,))
+        return self.cursor.fetchall()
+
+    def check_in_reservation(self, reservation_id, at):
+        self.cursor.execute("""
+            UPDATE reservations SET checked_in_at = %s
+            WHERE reservation_id = %s AND status = 'active' AND checked_in_at IS NULL
+        """, (at, reservation_id))
+        if self.cursor.rowcount == 1:
+            return True
+        # a repeated plate read, or another process that checked the car in first
+        self.cursor.execute("""
+            SELECT checked_in_at FROM reservations
+            WHERE reservation_id = %s AND status != 'cancelled'
+        """, (reservation_id,))
+        row = self.cursor.fetchone()
+        return bool(row and row["checked_in_at"])
+
+    def check_out_reservation(self, reservation_id, at):
+        # after_reservation_update releases the spot if the booking was still active
+        self.cursor.execute("""
+            UPDATE reservations SET status = 'completed', checked_out_at = %s
+            WHERE reservation_id = %s AND status != 'cancelled'
+              AND checked_in_at IS NOT NULL AND checked_out_at IS NULL
+        """, (at, reservation_id))
+        return self.cursor.rowcount == 1
+
+    def add_waitlist_entry(self, user_id, lot_id, start_time, end_time, priority=0):
+        self.cursor.execute("""
+            INSERT INTO waitlist (user_id, lot_id, start_time, end_time, priority)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (user_id, lot_id, start_time, end_time, priority))
+        return self.cursor.lastrowid
+
+    def find_waitlist_entry(self, user_id, lot_id, start_time, end_time):
+        self.cursor.execute("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, created_at
+            FROM waitlist
+            WHERE user_id = %s AND lot_id = %s AND start_time = %s AND end_time = %s AND status = 'waiting'
+        """, (user_id, lot_id, start_time, end_time))
+        return self.cursor.fetchone()
+
+    def count_waiting(self, lot_id):
+        self.cursor.execute("""
+            SELECT COUNT(*) as waiting FROM waitlist WHERE lot_id = %s AND status = 'waiting'
+        """, (lot_id,))
+        return self.cursor.fetchone()["waiting"]
+
+    def waiting_entries(self, lot_id):
+        self.cursor.execute("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, created_at
+            FROM waitlist
+            WHERE lot_id = %s AND status = 'waiting'
+        """, (lot_id,))
+        return self.cursor.fetchall()
+
+    def lots_to_allocate(self):
+        self.cursor.execute("""
+            SELECT p.lot_id, p.available_spots
+            FROM parking_lots p
+            WHERE p.status = 'open' AND p.available_spots > 0
+              AND EXISTS (SELECT 1 FROM waitlist w WHERE w.lot_id = p.lot_id AND w.status = 'waiting')
+        """)
+        return self.cursor.fetchall()
+
+    def set_waitlist_status(self, waitlist_id, status, from_status):
+        self.cursor.execute("""
+            UPDATE waitlist SET status = %s WHERE waitlist_id = %s AND status = %s
+        """, (status, waitlist_id, from_status))
+        return self.cursor.rowcount == 1
+
+    def complete_waitlist_entry(self, waitlist_id, reservation_id):
+        self.cursor.execute("""
+            UPDATE waitlist SET reservation_id = %s, allocated_at = NOW() WHERE waitlist_id = %s
+        """, (reservation_id, waitlist_id))
+
+    def get_idempotency_record(self, key, ttl_seconds):
+        self.cursor.execute("""
+            SELECT request_hash, response FROM idempotency_keys
+            WHERE idem_key = %s AND created_at >= NOW() - INTERVAL %s SECOND
+        """, (key, ttl_seconds))
+        return self.cursor.fetchone()
+
+    def claim_idempotency_key(self, key, user_id, request_hash, ttl_seconds):
+        self.cursor.execute("""
+            DELETE FROM idempotency_keys
+            WHERE idem_key = %s AND created_at < NOW() - INTERVAL %s SECOND
+        """, (key, ttl_seconds))
+        try:
+            self.cursor.execute("""
+                INSERT INTO idempotency_keys (idem_key, user_id, request_hash)
+                VALUES (%s, %s, %s)
+            """, (key, user_id, request_hash))
+        except IntegrityError:
+            return False
+        return True
+
+    def complete_idempotency_key(self, key, response_json):
+        self.cursor.execute("""
+            UPDATE idempotency_keys SET response = %s WHERE idem_key = %s
+        """, (response_json, key))
+
+    def commit(self):
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def close(self):
+        self.cursor.close()
+        self.db.close()
+
+
+class MySQLRepository(ParkingRepository):
+    def _read(self, user_id=None, shard_id=0, primary=False):
+        db = get_shard_db(shard_id) if primary else get_read_shard_db(shard_id, user_id)
+        if not db:
+            raise DatabaseUnavailableError("Database connection failed")
+        return db
+
+    def _fetch(self, query, params=(), one=False, user_id=None, shard_id=0, primary=False):
+        db = self._read(user_id, shard_id, primary)
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute(query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+        except (InterfaceError, OperationalError) as e:
+            # lost connection or DB_CONNECT_TIMEOUT expired mid-query
+            report_failure(db)
+            raise DatabaseUnavailableError(str(e))
+        finally:
+            cursor.close()
+            db.close()
+
+    def shard_ids(self):
+        return shard_ids()
+
+    def user_shards(self, user_id):
+        if not is_sharded() or not capabilities.has("user_shards"):
+            return [0]
+        rows = self._fetch("SELECT shard_id FROM user_shards WHERE user_id = %s", (user_id,), user_id=user_id)
+        return sorted({0} | {row["shard_id"] for row in rows if row["shard_id"] in shard_ids()})
+
+    def list_lots(self, primary=False):
+        lots = []
+        for shard_lots in fan_out(
+            lambda shard_id: self._fetch(f"SELECT {lot_columns()} FROM parking_lots", shard_id=shard_id, primary=primary)
+        ):
+            lots.extend(shard_lots)
+        return lots
+
+    def get_lot(self, lot_id, primary=False):
+        return self._fetch(
+            f"SELECT {lot_columns()} FROM parking_lots WHERE lot_id = %s", (lot_id,),
+            one=True, shard_id=shard_for_id(lot_id), primary=primary
+        )
+
+    def get_lots(self, lot_ids, primary=False):
+        by_shard = {}
+        for lot_id in set(lot_ids):
+            by_shard.setdefault(shard_for_id(lot_id), []).append(lot_id)
+        lots = []
+        for shard_lots in fan_out(
+            lambda shard_id: self._fetch(
+                f"SELECT {lot_columns()} FROM parking_lots WHERE lot_id IN ({', '.join(['%s'] * len(by_shard[shard_id]))})",
+                by_shard[shard_id], shard_id=shard_id, primary=primary
+            ),
+            sorted(by_shard)
+        ):
+            lots.extend(shard_lots)
+        return lots
+
+    def calculate_cost(self, lot_id, start_time, end_time):
+        shard_id = shard_for_id(lot_id)
+        if capabilities.has("calculate_parking_cost"):
+            row = self._fetch(
+                "SELECT calculate_parking_cost(%s, %s, %s) as cost", (lot_id, start_time, end_time), one=True, shard_id=shard_id
+            )
+        else:
+            row = self._fetch(LOT_COST_QUERY, (start_time, end_time, lot_id), one=True, shard_id=shard_id)
+        return float(row["cost"]) if row and row["cost"] is not None else 0.0
+
+    def lot_status(self, lot_id):
+        shard_id = shard_for_id(lot_id)
+        if capabilities.has("get_lot_status") and capabilities.has("check_available_spots"):
+            return self._fetch(
+                "SELECT get_lot_status(%s) as status, check_available_spots(%s) as available_spots",
+                (lot_id, lot_id),
+                one=True,
+                shard_id=shard_id,
+            )
+        # get_lot_status reports an unknown lot as available with no spots
+        row = self._fetch(LOT_STATUS_QUERY, (lot_id,), one=True, shard_id=shard_id)
+        return row or {"status": "available", "available_spots": 0}
+
+    def _shard_user_bookings(self, shard_id, user_id, include_archived):
+        db = self._read(user_id, shard_id)
+        cursor = db.cursor(dictionary=True)
+        try:
+            if shard_id != 0:
+                cursor.execute(SHARD_USER_BOOKINGS_QUERY.format(table="reservations"), (user_id,))
+            elif capabilities.has("v_user_bookings"):
+                cursor.execute(USER_BOOKINGS_VIEW_QUERY, (user_id,))
+            else:
+                cursor.execute(USER_BOOKINGS_QUERY, (user_id,))
+            bookings = cursor.fetchall()
+
+            if include_archived and capabilities.has("reservations_archive"):
+                if shard_id != 0:
+                    cursor.execute(SHARD_USER_BOOKINGS_QUERY.format(table="reservations_archive"), (user_id,))
+                else:
+                    cursor.execute(ARCHIVED_USER_BOOKINGS_QUERY, (user_id,))
+                bookings.extend(cursor.fetchall())
+
+            return bookings
+        finally:
+            cursor.close()
+            db.close()
+
+    def user_bookings(self, user_id, include_archived=False):
+        shards = self.user_shards(user_id)
+        bookings = []
+        for shard_bookings in fan_out(lambda shard_id: self._shard_user_bookings(shard_id, user_id, include_archived), shards):
+            bookings.extend(shard_bookings)
+
+        if len(shards) > 1:
+            user = self._fetch("SELECT name, email FROM users WHERE user_id = %s", (user_id,), one=True, user_id=user_id)
+            for booking in bookings:
+                if "user_name" not in booking:
+                    booking["user_name"] = user["name"] if user else None
+                    booking["email"] = user["email"] if user else None
+            bookings.sort(key=lambda booking: booking["created_at"], reverse=True)
+        return bookings
+
+    def list_users(self):
+        return self._fetch("SELECT user_id, name, email, role, created_at FROM users")
+
+    def get_user_by_email(self, email):
+        # login must see users created moments ago, so read from the primary
+        db = get_db()
+        if not db:
+            raise DatabaseUnavailableError("Database connection failed")
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+            db.close()
+
+    def _shard_reservation_history(self, shard_id, since_id, include_archived):
+        db = self._read(shard_id=shard_id)
+        cursor = db.cursor(dictionary=True)
+        try:
+            cursor.execute(RESERVATION_HISTORY_QUERY, (since_id,))
+            rows = cursor.fetchall()
+            if include_archived and capabilities.has("reservations_archive"):
+                cursor.execute(ARCHIVED_RESERVATION_HISTORY_QUERY)
+                rows.extend(cursor.fetchall())
+            return rows
+        finally:
+            cursor.close()
+            db.close()
+
+    def reservation_history(self, since_ids=None, include_archived=False):
+        since_ids = since_ids or {}
+        rows = []
+        for shard_rows in fan_out(
+            lambda shard_id: self._shard_reservation_history(shard_id, since_ids.get(shard_id, 0), include_archived)
+        ):
+            rows.extend(shard_rows)
+        return rows
+
+    def user_waitlist(self, user_id):
+        entries = []
+        for shard_entries in fan_out(lambda shard_id: self._fetch("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, status,
+                   reservation_id, created_at, allocated_at
+            FROM waitlist
+            WHERE user_id = %s
+            ORDER BY created_at DESC
+        """, (user_id,), user_id=user_id, shard_id=shard_id), self.user_shards(user_id)):
+            entries.extend(shard_entries)
+        entries.sort(key=lambda entry: entry["created_at"], reverse=True)
+        return entries
+
+    def _shard_gate_reservations(self, shard_id, now, reservation_ids):
+        # read from the primary so the plate index sees a booking right after it is written
+        db = get_shard_db(shard_id)
+        if not db:
+            raise DatabaseUnavailableError("Database connection failed")
+        cursor = db.cursor(dictionary=True)
+        try:
+            query = GATE_RESERVATIONS_QUERY if shard_id == 0 else SHARD_GATE_RESERVATIONS_QUERY
+            params = [now, now - GATE_EXIT_WINDOW]
+            if reservation_ids is not None:
+                query += f" AND r.reservation_id IN ({', '.join(['%s'] * len(reservation_ids))})"
+                params.extend(reservation_ids)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            db.close()
+
+    def _with_plates(self, rows):
+        # attach the owner's plates from shard 0 to reservations read from other shards
+        user_ids = sorted({row["user_id"] for row in rows})
+        if not user_ids:
+            return []
+        vehicles = self._fetch(
+            f"SELECT user_id, license_plate FROM vehicles WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            user_ids,
+        )
+        plates = {}
+        for vehicle in vehicles:
+            plates.setdefault(vehicle["user_id"], []).append(vehicle["license_plate"])
+        return [dict(row, license_plate=plate) for row in rows for plate in plates.get(row["user_id"], ())]
+
+    def gate_reservations(self, now, reservation_ids=None):
+        if reservation_ids is None:
+            shards = shard_ids()
+        else:
+            shards = sorted({shard_for_id(reservation_id) for reservation_id in reservation_ids})
+
+        def load(shard_id):
+            ids = None
+            if reservation_ids is not None:
+                ids = [reservation_id for reservation_id in reservation_ids if shard_for_id(reservation_id) == shard_id]
+            rows = self._shard_gate_reservations(shard_id, now, ids)
+            return rows if shard_id == 0 else self._with_plates(rows)
+
+        rows = []
+        for shard_rows in fan_out(load, shards):
+            rows.extend(shard_rows)
+        return rows
+
+    def begin(self, shard_id=0):
+        db = get_shard_db(shard_id)
+        if not db:
+            raise DatabaseUnavailableError("Database connection failed")
+        return MySQLTransaction(db, shard_id)
+
+
+_repository = None
+
+
+def get_repository():
+    global _repository
+    if _repository is None:
+        if os.getenv("DB_BACKEND", "mysql") == "sqlite":
+            from sqlite_repository import SQLiteRepository
+            _repository = SQLiteRepository(os.getenv("SQLITE_PATH", "parking.db"))
+        else:
+            _repository = MySQLRepository()
+    return _repository
@@ -1,17 +1,40 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
 from pydantic import BaseModel
-from database import get_db
-from typing import Optional
-from datetime import datetime
+from database import breaker_states, get_db, get_read_db, get_shard_db, get_read_shard_db, fan_out, shard_ids, shard_for_id, shard_for_location
+from repository import get_repository, DatabaseUnavailableError
+from typing import List, Literal, Optional
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import capabilities
+import csv
+import events
+import forecast
+import io
+import os
+import profiling
+import rate_limit
+import search_index
+import sensor_buffer
+import threading
+import time
+import waitlist
 
-router = APIRouter(prefix="/admin", tags=["Admin"])
+router = APIRouter(prefix="/admin", tags=["Admin"], route_class=profiling.ProfiledRoute)
 
-@router.get("/stats")
-def get_admin_stats():
-    db = get_db()
+# /admin/dashboard sections are shared by every admin for this many seconds
+DASHBOARD_CACHE_SECONDS = float(os.getenv("ADMIN_DASHBOARD_CACHE_SECONDS", "5"))
+USERS_PAGE_SIZE = 50
+MAX_USERS_PAGE_SIZE = 500
+
+def read_shard(shard_id, batch=False):
+    db = get_read_shard_db(shard_id, batch=batch)
     if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
+        raise DatabaseUnavailableError("Database connection failed")
+    return db
+
+def shard_stats(shard_id):
+    db = read_shard(shard_id)
     cursor = db.cursor(dictionary=True)
     
     try:
@@ -24,17 +47,20 @@ def get_admin_stats():
         cursor.execute("SELECT SUM(available_spots) as total FROM parking_lots")
         available_spots = cursor.fetchone()["total"] or 0
         
-        cursor.execute("SELECT COUNT(*) as total FROM users WHERE role = 'driver'")
-        total_users = cursor.fetchone()["total"]
+        # users only live on shard 0
+        total_users = 0
+        if shard_id == 0:
+            cursor.execute("SELECT COUNT(*) as total FROM users WHERE role = 'driver'")
+            total_users = cursor.fetchone()["total"]
         
-        try:
+        if capabilities.has("reservations"):
             cursor.execute("SELECT COUNT(*) as total FROM reservations")
             total_bookings = cursor.fetchone()["total"]
-        except:
+        else:
             cursor.execute("SELECT COUNT(*) as total FROM parking_spots WHERE is_occupied = 1")
             total_bookings = cursor.fetchone()["total"]
         
-        try:
+        if capabilities.has("reservations"):
             cursor.execute("""
                 SELECT COALESCE(SUM(total_cost), 0) as revenue 
                 FROM reservations 
@@ -42,7 +68,7 @@ def get_admin_stats():
             """)
             revenue_result = cursor.fetchone()
             total_revenue = float(revenue_result["revenue"]) if revenue_result["revenue"] else 0.0
-        except:
+        else:
             cursor.execute("""
                 SELECT COALESCE(SUM(p.hourly_rate * 2), 0) as revenue 
                 FROM parking_lots p
@@ -51,66 +77,133 @@ def get_admin_stats():
             revenue_result = cursor.fetchone()
             total_revenue = float(revenue_result["revenue"]) if revenue_result["revenue"] else 0.0
         
-        occupied_spots = total_spots - available_spots
-        
         return {
             "total_lots": total_lots,
             "total_spots": total_spots,
             "available_spots": available_spots,
-            "occupied_spots": occupied_spots,
             "total_users": total_users,
             "total_bookings": total_bookings,
-            "total_revenue": round(total_revenue, 2),
-            "occupancy_rate": round((occupied_spots / total_spots * 100) if total_spots > 0 else 0, 2)
+            "total_revenue": total_revenue
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
     finally:
         cursor.close()
         db.close()
 
-@router.get("/bookings")
-def get_all_bookings():
-    db = get_db()
-    if not db:
+@router.get("/stats")
+def get_admin_stats():
+    try:
+        shards = fan_out(shard_stats)
+    except DatabaseUnavailableError:
         raise HTTPException(status_code=500, detail="Database connection failed")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
+    
+    totals = {key: sum(stats[key] for stats in shards) for key in shards[0]}
+    total_spots = totals["total_spots"]
+    occupied_spots = total_spots - totals["available_spots"]
     
+    return {
+        "total_lots": totals["total_lots"],
+        "total_spots": total_spots,
+        "available_spots": totals["available_spots"],
+        "occupied_spots": occupied_spots,
+        "total_users": totals["total_users"],
+        "total_bookings": totals["total_bookings"],
+        "total_revenue": round(totals["total_revenue"], 2),
+        "occupancy_rate": round((occupied_spots / total_spots * 100) if total_spots > 0 else 0, 2)
+    }
+
+def shard_bookings(shard_id):
+    db = read_shard(shard_id)
     cursor = db.cursor(dictionary=True)
     
     try:
-        try:
+        if shard_id != 0:
+            # users are joined in from shard 0 after merging
+            cursor.execute("""
+                SELECT 
+                    r.reservation_id,
+                    r.user_id,
+                    r.lot_id,
+                    p.lot_name,
+                    p.location,
+                    r.start_time,
+                    r.end_time,
+                    TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
+                    r.total_cost,
+                    r.status,
+                    r.created_at
+                FROM reservations r
+                JOIN parking_lots p ON r.lot_id = p.lot_id
+                ORDER BY r.created_at DESC
+                LIMIT 100
+            """)
+            return cursor.fetchall()
+        if capabilities.has("v_user_bookings"):
             cursor.execute("""
                 SELECT * FROM v_user_bookings
                 ORDER BY created_at DESC
                 LIMIT 100
             """)
-            bookings = cursor.fetchall()
-        except:
-            try:
-                cursor.execute("""
-                    SELECT 
-                        r.reservation_id,
-                        r.user_id,
-                        u.name as user_name,
-                        u.email,
-                        r.lot_id,
-                        p.lot_name,
-                        p.location,
-                        r.start_time,
-                        r.end_time,
-                        TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
-                        r.total_cost,
-                        r.status,
-                        r.created_at
-                    FROM reservations r
-                    JOIN users u ON r.user_id = u.user_id
-                    JOIN parking_lots p ON r.lot_id = p.lot_id
-                    ORDER BY r.created_at DESC
-                    LIMIT 100
-                """)
-                bookings = cursor.fetchall()
-            except:
-                bookings = []
+            return cursor.fetchall()
+        if capabilities.has("reservations"):
+            cursor.execute("""
+                SELECT 
+                    r.reservation_id,
+                    r.user_id,
+                    u.name as user_name,
+                    u.email,
+                    r.lot_id,
+                    p.lot_name,
+                    p.location,
+                    r.start_time,
+                    r.end_time,
+                    TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
+                    r.total_cost,
+                    r.status,
+                    r.created_at
+                FROM reservations r
+                JOIN users u ON r.user_id = u.user_id
+                JOIN parking_lots p ON r.lot_id = p.lot_id
+                ORDER BY r.created_at DESC
+                LIMIT 100
+            """)
+            return cursor.fetchall()
+        return []
+    finally:
+        cursor.close()
+        db.close()
+
+def attach_users(bookings):
+    user_ids = sorted({booking["user_id"] for booking in bookings if "user_name" not in booking})
+    if not user_ids:
+        return
+    db = read_shard(0)
+    cursor = db.cursor(dictionary=True)
+    try:
+        cursor.execute(
+            f"SELECT user_id, name, email FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+            user_ids
+        )
+        users = {user["user_id"]: user for user in cursor.fetchall()}
+    finally:
+        cursor.close()
+        db.close()
+    for booking in bookings:
+        if "user_name" not in booking:
+            user = users.get(booking["user_id"], {})
+            booking["user_name"] = user.get("name")
+            booking["email"] = user.get("email")
+
+@router.get("/bookings")
+def get_all_bookings():
+    try:
+        bookings = []
+        for rows in fan_out(shard_bookings):
+            bookings.extend(rows)
+        if len(shard_ids()) > 1:
+            bookings = sorted(bookings, key=lambda booking: booking["created_at"], reverse=True)[:100]
+            attach_users(bookings)
         
         for booking in bookings:
             if booking.get('start_time'):
@@ -121,26 +214,29 @@ def get_all_bookings():
                 booking['created_at'] = booking['created_at'].isoformat() if hasattr(booking['created_at'], 'isoformat') else str(booking['created_at'])
         
         return {"bookings": bookings}
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching bookings: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
 
-@router.get("/lots/manage")
-def get_all_lots_manage():
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
+def shard_lots_manage(shard_id):
+    db = read_shard(shard_id)
     cursor = db.cursor(dictionary=True)
     
     try:
-        try:
-            cursor.execute("SELECT * FROM v_parking_lot_summary ORDER BY lot_id")
-            lots = cursor.fetchall()
-        except:
-            cursor.execute("""
+        # sensor_ingestion.sql adds the sensor count next to the reservation-based counts
+        sensor_column = ""
+        if capabilities.has("parking_lots.sensor_occupied_spots"):
+            sensor_column = ", sensor_occupied_spots"
+        
+        if capabilities.has("v_parking_lot_summary"):
+            cursor.execute(f"""
+                SELECT v.*{sensor_column} FROM v_parking_lot_summary v
+                JOIN parking_lots USING (lot_id)
+                ORDER BY lot_id
+            """)
+        else:
+            cursor.execute(f"""
                 SELECT 
                     lot_id,
                     lot_name,
@@ -155,18 +251,27 @@ def get_all_lots_manage():
                         WHEN available_spots = 0 THEN 'FULL'
                         WHEN available_spots <= 5 THEN 'LOW'
                         ELSE 'AVAILABLE'
-                    END as availability_status
+                    END as availability_status{sensor_column}
                 FROM parking_lots
                 ORDER BY lot_id
             """)
-            lots = cursor.fetchall()
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        db.close()
+
+@router.get("/lots/manage")
+def get_all_lots_manage():
+    try:
+        lots = []
+        for rows in fan_out(shard_lots_manage):
+            lots.extend(rows)
         
         return {"lots": lots}
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching lots: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
 
 class UpdateLotRequest(BaseModel):
     lot_name: Optional[str] = None
@@ -177,7 +282,7 @@ class UpdateLotRequest(BaseModel):
 
 @router.put("/lots/{lot_id}")
 def update_lot(lot_id: int, data: UpdateLotRequest):
-    db = get_db()
+    db = get_shard_db(shard_for_id(lot_id))
     if not db:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -211,6 +316,7 @@ def update_lot(lot_id: int, data: UpdateLotRequest):
         
         cursor.execute(query, params)
         db.commit()
+        events.publish(events.LOTS_CHANGED, [lot_id])
         
         cursor.execute("SELECT * FROM parking_lots WHERE lot_id = %s", (lot_id,))
         updated_lot = cursor.fetchone()
@@ -223,9 +329,206 @@ def update_lot(lot_id: int, data: UpdateLotRequest):
         cursor.close()
         db.close()
 
+# parking_lots.status is ENUM('open', 'closed'); anything else would be stored as '' by MySQL
+LotStatus = Literal["open", "closed"]
+
+class BulkLotFilters(BaseModel):
+    lot_ids: Optional[List[int]] = None
+    location: Optional[str] = None
+    status: Optional[LotStatus] = None
+
+class BulkLotChanges(BaseModel):
+    hourly_rate: Optional[float] = None
+    rate_change_percent: Optional[float] = None
+    status: Optional[LotStatus] = None
+
+class BulkLotRequest(BaseModel):
+    filters: BulkLotFilters
+    changes: BulkLotChanges
+    changed_by: Optional[str] = None
+
+def bulk_update_shard(cursor, filters, filter_params, updates, changed_by):
+    # lock the matching lots so the id list stays valid after a status change
+    cursor.execute(
+        f"SELECT lot_id, hourly_rate, status FROM parking_lots WHERE {' AND '.join(filters)} FOR UPDATE",
+        filter_params
+    )
+    before = {lot["lot_id"]: lot for lot in cursor.fetchall()}
+    
+    if not before:
+        return [], {}, 0
+    
+    lot_ids = list(before)
+    id_list = ", ".join(["%s"] * len(lot_ids))
+    
+    # the audit trigger would insert one row per lot and field; write them all at once below instead
+    cursor.execute("SET @skip_lot_audit = 1")
+    
+    updated = {}
+    for assignment, params in updates:
+        cursor.execute(f"UPDATE parking_lots SET {assignment} WHERE lot_id IN ({id_list})", params + lot_ids)
+        updated[assignment.split(" =")[0]] = cursor.rowcount
+    
+    cursor.execute(f"SELECT lot_id, hourly_rate, status FROM parking_lots WHERE lot_id IN ({id_list})", lot_ids)
+    after = cursor.fetchall()
+    
+    audit_rows = []
+    for lot in after:
+        old = before[lot["lot_id"]]
+        if old["hourly_rate"] != lot["hourly_rate"]:
+            audit_rows.append((lot["lot_id"], "rate_change", str(old["hourly_rate"]), str(lot["hourly_rate"]), changed_by))
+        if old["status"] != lot["status"]:
+            audit_rows.append((lot["lot_id"], "status_change", old["status"], lot["status"], changed_by))
+    
+    if audit_rows:
+        cursor.execute(
+            "INSERT INTO parking_lot_audit (lot_id, action, old_value, new_value, changed_by) VALUES "
+            + ", ".join(["(%s, %s, %s, %s, %s)"] * len(audit_rows)),
+            [value for row in audit_rows for value in row]
+        )
+    
+    return lot_ids, updated, len(audit_rows)
+
+@router.post("/lots/bulk")
+def bulk_update_lots(data: BulkLotRequest):
+    filters = []
+    filter_params = []
+    
+    if data.filters.lot_ids:
+        filters.append(f"lot_id IN ({', '.join(['%s'] * len(data.filters.lot_ids))})")
+        filter_params.extend(data.filters.lot_ids)
+    if data.filters.location is not None:
+        filters.append("location = %s")
+        filter_params.append(data.filters.location)
+    if data.filters.status is not None:
+        filters.append("status = %s")
+        filter_params.append(data.filters.status)
+    
+    if not filters:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    
+    changes = data.changes
+    if changes.hourly_rate is not None and changes.rate_change_percent is not None:
+        raise HTTPException(status_code=400, detail="Use either hourly_rate or rate_change_percent, not both")
+    if changes.hourly_rate is not None and changes.hourly_rate < 0:
+        raise HTTPException(status_code=400, detail="hourly_rate cannot be negative")
+    if changes.rate_change_percent is not None and changes.rate_change_percent < -100:
+        raise HTTPException(status_code=400, detail="rate_change_percent cannot be below -100")
+    
+    updates = []
+    if changes.hourly_rate is not None:
+        updates.append(("hourly_rate = %s", [changes.hourly_rate]))
+    elif changes.rate_change_percent is not None:
+        updates.append(("hourly_rate = ROUND(hourly_rate * (1 + %s / 100), 2)", [changes.rate_change_percent]))
+    if changes.status is not None:
+        updates.append(("status = %s", [changes.status]))
+    
+    if not updates:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    
+    # lot ids name their shard; location and status filters have to ask every shard
+    if data.filters.lot_ids:
+        shards = sorted({shard_for_id(lot_id) for lot_id in data.filters.lot_ids})
+    else:
+        shards = shard_ids()
+    
+    connections = []
+    try:
+        lot_ids = []
+        shard_results = []
+        updated = {}
+        audit_rows = 0
+        for shard_id in shards:
+            db = get_shard_db(shard_id)
+            if not db:
+                raise DatabaseUnavailableError("Database connection failed")
+            cursor = db.cursor(dictionary=True)
+            connections.append((db, cursor))
+            
+            shard_lot_ids, shard_updated, shard_audit_rows = bulk_update_shard(
+                cursor, filters, filter_params, updates, data.changed_by
+            )
+            shard_results.append({"shard_id": shard_id, "lot_ids": shard_lot_ids})
+            lot_ids.extend(shard_lot_ids)
+            for field, count in shard_updated.items():
+                updated[field] = updated.get(field, 0) + count
+            audit_rows += shard_audit_rows
+        
+        if not lot_ids:
+            for db, _ in connections:
+                db.rollback()
+            return {"message": "No parking lots matched the filters", "matched": 0, "updated": {}, "audit_rows": 0, "lot_ids": []}
+        
+        # every shard has locked and updated its lots before the first commit, so validation and lock
+        # failures roll back everywhere. There is no distributed transaction: if a commit itself fails,
+        # the shards already committed keep their changes and the response says what each shard did
+        failed = None
+        for (db, _), shard in zip(connections, shard_results):
+            if failed is not None:
+                db.rollback()
+                shard["status"] = "rolled_back"
+                continue
+            try:
+                db.commit()
+                shard["status"] = "committed"
+            except Exception as e:
+                failed = e
+                db.rollback()
+                shard["status"] = "failed"
+        
+        committed = [lot_id for shard in shard_results if shard["status"] == "committed" for lot_id in shard["lot_ids"]]
+        if committed:
+            events.publish(events.LOTS_CHANGED, committed)
+        if failed is not None:
+            raise HTTPException(status_code=500, detail={
+                "message": f"Error committing lot updates, {len(committed)} of {len(lot_ids)} lots were updated: {failed}",
+                "committed_lot_ids": committed,
+                "shards": shard_results
+            })
+        
+        return {
+            "message": "Parking lots updated successfully",
+            "matched": len(lot_ids),
+            "updated": updated,
+            "audit_rows": audit_rows,
+            "lot_ids": lot_ids,
+            "shards": shard_results
+        }
+    except HTTPException:
+        raise
+    except DatabaseUnavailableError:
+        for db, _ in connections:
+            db.rollback()
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    except Exception as e:
+        for db, _ in connections:
+            db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error updating lots: {str(e)}")
+    finally:
+        for db, cursor in connections:
+            try:
+                cursor.execute("SET @skip_lot_audit = NULL")
+            except Exception:
+                pass
+            cursor.close()
+            db.close()
+
+@router.get("/search")
+def admin_search(q: str = Query(..., min_length=1), kind: str = Query("users"), limit: int = Query(search_index.DEFAULT_LIMIT, ge=1, le=search_index.MAX_LIMIT)):
+    # prefix matches on user name/email or lot name/location, served from memory
+    try:
+        if kind == "users":
+            return {"users": search_index.search_users(q, limit)}
+        if kind == "lots":
+            return {"lots": search_index.search_lots(q, limit)}
+    except search_index.IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    raise HTTPException(status_code=400, detail="kind must be users or lots")
+
 @router.get("/users")
-def get_all_users():
-    db = get_db()
+def get_all_users(limit: int = Query(USERS_PAGE_SIZE, ge=1, le=MAX_USERS_PAGE_SIZE), offset: int = Query(0, ge=0)):
+    # newest first, one page at a time; finding a particular user goes through /admin/search
+    db = get_read_db()
     if not db:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -235,10 +538,11 @@ def get_all_users():
         cursor.execute("""
             SELECT user_id, name, email, role, created_at
             FROM users
-            ORDER BY created_at DESC
-        """)
+            ORDER BY created_at DESC, user_id DESC
+            LIMIT %s OFFSET %s
+        """, (limit, offset))
         users = cursor.fetchall()
-        return {"users": users}
+        return {"users": users, "limit": limit, "offset": offset}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching users: {str(e)}")
     finally:
@@ -254,7 +558,8 @@ class CreateLotRequest(BaseModel):
 
 @router.post("/lots")
 def create_parking_lot(data: CreateLotRequest):
-    db = get_db()
+    # new lots are placed by location so a city's lots and bookings share a shard
+    db = get_shard_db(shard_for_location(data.location))
     if not db:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -282,6 +587,7 @@ def create_parking_lot(data: CreateLotRequest):
             """, (lot_id, spot_num))
         
         db.commit()
+        events.publish(events.LOTS_CHANGED, [lot_id])
         
         cursor.execute("SELECT * FROM parking_lots WHERE lot_id = %s", (lot_id,))
         new_lot = cursor.fetchone()
@@ -296,7 +602,7 @@ def create_parking_lot(data: CreateLotRequest):
 
 @router.delete("/lots/{lot_id}")
 def delete_parking_lot(lot_id: int):
-    db = get_db()
+    db = get_shard_db(shard_for_id(lot_id))
     if not db:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
@@ -315,10 +621,12 @@ def delete_parking_lot(lot_id: int):
                 detail=f"Cannot delete lot with {active_bookings} active bookings"
             )
         
+        cursor.execute("DELETE FROM reservations WHERE lot_id = %s", (lot_id,))
         cursor.execute("DELETE FROM parking_spots WHERE lot_id = %s", (lot_id,))
         cursor.execute("DELETE FROM parking_lots WHERE lot_id = %s", (lot_id,))
         
         db.commit()
+        events.publish(events.LOTS_CHANGED, [lot_id])
         
         return {"message": "Parking lot deleted successfully"}
     except HTTPException:
@@ -332,45 +640,71 @@ def delete_parking_lot(lot_id: int):
 
 @router.delete("/bookings/{booking_id}")
 def delete_booking(booking_id: int):
-    db = get_db()
-    if not db:
+    try:
+        tx = get_repository().begin(shard_for_id(booking_id))
+    except DatabaseUnavailableError:
         raise HTTPException(status_code=500, detail="Database connection failed")
     
-    cursor = db.cursor(dictionary=True)
-    
+    booking = None
     try:
-        cursor.execute("""
-            SELECT lot_id, status FROM reservations WHERE reservation_id = %s
-        """, (booking_id,))
-        booking = cursor.fetchone()
+        booking = tx.get_reservation(booking_id)
         
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
         
+        tx.delete_reservation(booking_id)
+        
+        allocation = None
         if booking["status"] == "active":
-            cursor.execute("""
-                UPDATE parking_lots 
-                SET available_spots = available_spots + 1 
-                WHERE lot_id = %s
-            """, (booking["lot_id"],))
-            
-            cursor.execute("""
-                UPDATE parking_spots 
-                SET is_occupied = 0 
-                WHERE lot_id = %s AND is_occupied = 1 
-                LIMIT 1
-            """, (booking["lot_id"],))
+            allocation = waitlist.allocate_next(tx, booking["lot_id"])
         
-        cursor.execute("DELETE FROM reservations WHERE reservation_id = %s", (booking_id,))
+        tx.commit()
+        events.publish(events.RESERVATIONS_CHANGED, [booking_id])
+        invalidate_dashboard()
+        waitlist.notify([allocation])
         
+        return {"message": "Booking deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        tx.rollback()
+        if booking:
+            waitlist.invalidate(booking["lot_id"])
+        raise HTTPException(status_code=500, detail=f"Error deleting booking: {str(e)}")
+    finally:
+        tx.close()
+
+class WaitlistPriorityRequest(BaseModel):
+    priority: int
+
+@router.put("/waitlist/{waitlist_id}/priority")
+def set_waitlist_priority(waitlist_id: int, data: WaitlistPriorityRequest):
+    db = get_shard_db(shard_for_id(waitlist_id))
+    if not db:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    
+    cursor = db.cursor(dictionary=True)
+    
+    try:
+        cursor.execute("SELECT lot_id, status FROM waitlist WHERE waitlist_id = %s", (waitlist_id,))
+        entry = cursor.fetchone()
+        
+        if not entry:
+            raise HTTPException(status_code=404, detail="Waitlist entry not found")
+        
+        if entry["status"] != "waiting":
+            raise HTTPException(status_code=400, detail="Waitlist entry is no longer waiting")
+        
+        cursor.execute("UPDATE waitlist SET priority = %s WHERE waitlist_id = %s", (data.priority, waitlist_id))
         db.commit()
+        waitlist.invalidate(entry["lot_id"])
         
-        return {"message": "Booking deleted successfully"}
+        return {"message": "Waitlist priority updated", "waitlist_id": waitlist_id, "priority": data.priority}
     except HTTPException:
         raise
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Error deleting booking: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error updating waitlist priority: {str(e)}")
     finally:
         cursor.close()
         db.close()
@@ -405,9 +739,11 @@ def create_user(data: CreateUserRequest):
         
         user_id = cursor.lastrowid
         db.commit()
+        invalidate_dashboard()
         
         cursor.execute("SELECT user_id, name, email, role FROM users WHERE user_id = %s", (user_id,))
         new_user = cursor.fetchone()
+        search_index.put_user(new_user)
         
         return {"message": "User created successfully", "user": new_user}
     except HTTPException:
@@ -419,6 +755,23 @@ def create_user(data: CreateUserRequest):
         cursor.close()
         db.close()
 
+def delete_user_from_shard(shard_id, user_id):
+    db = get_shard_db(shard_id)
+    if not db:
+        raise DatabaseUnavailableError("Database connection failed")
+    cursor = db.cursor()
+    try:
+        # sharding.sql drops the waitlist's user foreign key on shards other than 0, so nothing cascades here
+        cursor.execute("DELETE FROM waitlist WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM reservations WHERE user_id = %s", (user_id,))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+
 @router.delete("/users/{user_id}")
 def delete_user(user_id: int):
     db = get_db()
@@ -434,9 +787,17 @@ def delete_user(user_id: int):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
+        # reservations on other shards go first so a failure leaves the user in place to retry
+        for shard_id in get_repository().user_shards(user_id):
+            if shard_id != 0:
+                delete_user_from_shard(shard_id, user_id)
+        
+        cursor.execute("DELETE FROM reservations WHERE user_id = %s", (user_id,))
         cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
         
         db.commit()
+        invalidate_dashboard()
+        search_index.remove_user(user_id)
         
         return {"message": "User deleted successfully"}
     except HTTPException:
@@ -448,44 +809,36 @@ def delete_user(user_id: int):
         cursor.close()
         db.close()
 
-@router.get("/analytics")
-def get_analytics():
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
+def shard_analytics(shard_id):
+    # full-history aggregates; runs on the batch pool without the request query timeout
+    db = read_shard(shard_id, batch=True)
     cursor = db.cursor(dictionary=True)
     
     try:
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM information_schema.tables 
-            WHERE table_schema = DATABASE() AND table_name = 'reservations'
-        """)
-        has_reservations = cursor.fetchone()["count"] > 0
-        
         revenue_by_day = []
         top_lots = []
-        above_avg_lots = []
+        lot_revenues = []
         booking_stats = {"total": 0, "active": 0, "completed": 0}
-        revenue_with_cte = []
+        # sections that could not be read are reported rather than shown as zero
+        errors = []
         
-        if has_reservations:
-            try:
-                cursor.execute("""
-                    SELECT 
-                        DATE(created_at) as date,
-                        COUNT(CASE WHEN status != 'cancelled' THEN 1 END) as bookings_count,
-                        COALESCE(SUM(CASE WHEN status != 'cancelled' THEN total_cost ELSE 0 END), 0) as revenue
-                    FROM reservations
-                    WHERE created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
-                    GROUP BY DATE(created_at)
-                    ORDER BY date DESC
-                """)
-                revenue_by_day = cursor.fetchall()
-            except:
-                revenue_by_day = []
-            
-            try:
+        try:
+            cursor.execute("""
+                SELECT 
+                    DATE(created_at) as date,
+                    COUNT(CASE WHEN status != 'cancelled' THEN 1 END) as bookings_count,
+                    COALESCE(SUM(CASE WHEN status != 'cancelled' THEN total_cost ELSE 0 END), 0) as revenue
+                FROM reservations
+                WHERE created_at >= DATE_SUB(NOW(), INTERVAL 7 DAY)
+                GROUP BY DATE(created_at)
+                ORDER BY date DESC
+            """)
+            revenue_by_day = cursor.fetchall()
+        except Exception as e:
+            errors.append(f"shard {shard_id} revenue_by_day: {e}")
+        
+        try:
+            if capabilities.has("v_lot_revenue_summary"):
                 cursor.execute("""
                     SELECT 
                         lot_id,
@@ -500,91 +853,82 @@ def get_analytics():
                     ORDER BY total_revenue DESC
                     LIMIT 10
                 """)
-                top_lots = cursor.fetchall()
-                for lot in top_lots:
-                    lot['revenue'] = float(lot.get('revenue', 0) or 0)
-                    lot['total_bookings'] = int(lot.get('total_bookings', 0) or 0)
-            except:
-                try:
-                    cursor.execute("""
-                        SELECT 
-                            p.lot_id,
-                            p.lot_name,
-                            p.location,
-                            COUNT(CASE WHEN r.status != 'cancelled' THEN r.reservation_id END) as total_bookings,
-                            COALESCE(SUM(CASE WHEN r.status != 'cancelled' THEN r.total_cost ELSE 0 END), 0) as revenue,
-                            COALESCE(AVG(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as avg_booking_cost,
-                            COALESCE(MAX(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as max_booking_cost,
-                            COALESCE(MIN(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as min_booking_cost
-                        FROM parking_lots p
-                        LEFT JOIN reservations r ON p.lot_id = r.lot_id
-                        GROUP BY p.lot_id, p.lot_name, p.location
-                        HAVING total_bookings > 0 OR revenue > 0
-                        ORDER BY revenue DESC
-                        LIMIT 10
-                    """)
-                    top_lots = cursor.fetchall()
-                    for lot in top_lots:
-                        lot['revenue'] = float(lot.get('revenue', 0) or 0)
-                        lot['total_bookings'] = int(lot.get('total_bookings', 0) or 0)
-                except:
-                    top_lots = []
-            
-            try:
+            else:
                 cursor.execute("""
                     SELECT 
                         p.lot_id,
                         p.lot_name,
                         p.location,
-                        COALESCE(SUM(CASE WHEN r.status != 'cancelled' THEN r.total_cost ELSE 0 END), 0) as revenue
+                        COUNT(CASE WHEN r.status != 'cancelled' THEN r.reservation_id END) as total_bookings,
+                        COALESCE(SUM(CASE WHEN r.status != 'cancelled' THEN r.total_cost ELSE 0 END), 0) as revenue,
+                        COALESCE(AVG(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as avg_booking_cost,
+                        COALESCE(MAX(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as max_booking_cost,
+                        COALESCE(MIN(CASE WHEN r.status != 'cancelled' THEN r.total_cost END), 0) as min_booking_cost
                     FROM parking_lots p
                     LEFT JOIN reservations r ON p.lot_id = r.lot_id
                     GROUP BY p.lot_id, p.lot_name, p.location
-                    HAVING revenue > (
-                        SELECT COALESCE(AVG(lot_revenue), 0)
-                        FROM (
-                            SELECT 
-                                COALESCE(SUM(CASE WHEN r2.status != 'cancelled' THEN r2.total_cost ELSE 0 END), 0) as lot_revenue
-                            FROM parking_lots p2
-                            LEFT JOIN reservations r2 ON p2.lot_id = r2.lot_id
-                            GROUP BY p2.lot_id
-                        ) as lot_revenues
-                    )
+                    HAVING total_bookings > 0 OR revenue > 0
                     ORDER BY revenue DESC
+                    LIMIT 10
                 """)
-                above_avg_lots = cursor.fetchall()
-                for lot in above_avg_lots:
-                    lot['revenue'] = float(lot.get('revenue', 0) or 0)
-            except Exception as e:
-                above_avg_lots = []
-                print(f"Error in nested query: {str(e)}")
-            
-            try:
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total,
-                        COALESCE(SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END), 0) as active,
-                        COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0) as completed
-                    FROM reservations
-                """)
-                result = cursor.fetchone()
-                booking_stats = {
-                    "total": int(result["total"]) if result else 0,
-                    "active": int(result["active"]) if result else 0,
-                    "completed": int(result["completed"]) if result else 0
-                }
-            except Exception as e:
-                print(f"Error fetching booking stats: {e}")
-                booking_stats = {"total": 0, "active": 0, "completed": 0}
+            top_lots = cursor.fetchall()
+            for lot in top_lots:
+                lot['revenue'] = float(lot.get('revenue', 0) or 0)
+                lot['total_bookings'] = int(lot.get('total_bookings', 0) or 0)
+        except Exception as e:
+            top_lots = []
+            errors.append(f"shard {shard_id} top_parking_lots: {e}")
+        
+        try:
+            # the average is taken over the lots of every shard, so it is compared after merging
+            cursor.execute("""
+                SELECT 
+                    p.lot_id,
+                    p.lot_name,
+                    p.location,
+                    COALESCE(SUM(CASE WHEN r.status != 'cancelled' THEN r.total_cost ELSE 0 END), 0) as revenue
+                FROM parking_lots p
+                LEFT JOIN reservations r ON p.lot_id = r.lot_id
+                GROUP BY p.lot_id, p.lot_name, p.location
+            """)
+            lot_revenues = cursor.fetchall()
+            for lot in lot_revenues:
+                lot['revenue'] = float(lot.get('revenue', 0) or 0)
+        except Exception as e:
+            lot_revenues = []
+            errors.append(f"shard {shard_id} lot_revenues: {e}")
+        
+        try:
+            cursor.execute("""
+                SELECT 
+                    COUNT(*) as total,
+                    COALESCE(SUM(CASE WHEN status = 'active' THEN 1 ELSE 0 END), 0) as active,
+                    COALESCE(SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END), 0) as completed
+                FROM reservations
+            """)
+            result = cursor.fetchone()
+            booking_stats = {
+                "total": int(result["total"]) if result else 0,
+                "active": int(result["active"]) if result else 0,
+                "completed": int(result["completed"]) if result else 0
+            }
+        except Exception as e:
+            errors.append(f"shard {shard_id} booking_stats: {e}")
         
         return {
             "revenue_by_day": revenue_by_day,
             "top_parking_lots": top_lots,
-            "above_avg_lots": above_avg_lots,
+            "lot_revenues": lot_revenues,
             "booking_stats": booking_stats,
-            "revenue_trend": revenue_with_cte
+            "errors": errors
         }
-    except Exception as e:
+    finally:
+        cursor.close()
+        db.close()
+
+@router.get("/analytics")
+def get_analytics():
+    if not capabilities.has("reservations"):
         return {
             "revenue_by_day": [],
             "top_parking_lots": [],
@@ -592,6 +936,251 @@ def get_analytics():
             "booking_stats": {"total": 0, "active": 0, "completed": 0},
             "revenue_trend": []
         }
-    finally:
-        cursor.close()
-        db.close()
+    
+    try:
+        shards = fan_out(shard_analytics)
+        
+        days = {}
+        for row in (row for shard in shards for row in shard["revenue_by_day"]):
+            day = days.setdefault(row["date"], {"date": row["date"], "bookings_count": 0, "revenue": 0})
+            day["bookings_count"] += row["bookings_count"]
+            day["revenue"] += row["revenue"]
+        revenue_by_day = sorted(days.values(), key=lambda day: day["date"], reverse=True)
+        
+        top_lots = sorted(
+            (lot for shard in shards for lot in shard["top_parking_lots"]), key=lambda lot: lot["revenue"], reverse=True
+        )[:10]
+        
+        lot_revenues = [lot for shard in shards for lot in shard["lot_revenues"]]
+        average = sum(lot["revenue"] for lot in lot_revenues) / len(lot_revenues) if lot_revenues else 0
+        above_avg_lots = sorted(
+            (lot for lot in lot_revenues if lot["revenue"] > average), key=lambda lot: lot["revenue"], reverse=True
+        )
+        
+        booking_stats = {
+            key: sum(shard["booking_stats"][key] for shard in shards) for key in ("total", "active", "completed")
+        }
+        
+        return {
+            "revenue_by_day": revenue_by_day,
+            "top_parking_lots": top_lots,
+            "above_avg_lots": above_avg_lots,
+            "booking_stats": booking_stats,
+            "revenue_trend": [],
+            "errors": [error for shard in shards for error in shard["errors"]]
+        }
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching analytics: {str(e)}")
+
+
+@router.get("/lots/{lot_id}/forecast")
+def get_lot_capacity_forecast(lot_id: int):
+    profile = forecast.weekly_profile(lot_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No forecast available for this parking lot")
+    return {"forecast": profile}
+
+@router.get("/rate-limits")
+def get_rate_limit_stats():
+    return rate_limit.stats()
+
+@router.get("/sensors")
+def get_sensor_ingestion_stats():
+    return sensor_buffer.stats()
+
+@router.get("/database")
+def get_database_health():
+    return {"circuit_breakers": breaker_states()}
+
+class ProfilingRequest(BaseModel):
+    sample_rate: float
+
+@router.get("/profiling")
+def get_profiling_settings():
+    return profiling.settings()
+
+@router.put("/profiling")
+def set_profiling(data: ProfilingRequest):
+    # sample_rate 0 turns sampling off; 1 profiles every parking and admin request
+    if not 0 <= data.sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+    return {"message": "Profiling updated", "settings": profiling.configure(data.sample_rate)}
+
+@router.get("/profiles")
+def get_request_profiles():
+    return {"profiles": profiling.list_profiles()}
+
+@router.get("/profiles/{profile_id}")
+def get_request_profile(profile_id: int):
+    profile = profiling.get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@router.get("/capabilities")
+def get_schema_capabilities():
+    detected = capabilities.describe()
+    if detected is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return {"capabilities": detected}
+
+@router.post("/capabilities/refresh")
+def refresh_schema_capabilities():
+    # call after applying a migration so running processes pick up new views and functions
+    detected = capabilities.refresh()
+    if detected is None:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    return {"message": "Schema capabilities refreshed", "capabilities": detected}
+
+@router.get("/finance/export")
+def export_finance(start_date: str = Query(...), end_date: str = Query(...)):
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d")
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    def read_rows(shard_id):
+        db = read_shard(shard_id, batch=True)
+        cursor = db.cursor()
+        try:
+            query = """
+                SELECT reservation_id, user_id, lot_id, start_time, end_time, total_cost, status, created_at, 0 as archived
+                FROM reservations
+                WHERE start_time >= %s AND start_time < %s
+            """
+            params = [start_dt, end_dt]
+            # reservations_archive only exists once reservation_archival.sql has been applied
+            if capabilities.has("reservations_archive"):
+                query += """
+                    UNION ALL
+                    SELECT reservation_id, user_id, lot_id, start_time, end_time, total_cost, status, created_at, 1 as archived
+                    FROM reservations_archive
+                    WHERE start_time >= %s AND start_time < %s
+                """
+                params.extend([start_dt, end_dt])
+            cursor.execute(query + " ORDER BY start_time", params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            db.close()
+    
+    try:
+        rows = [row for shard_rows in fan_out(read_rows) for row in shard_rows]
+        if len(shard_ids()) > 1:
+            rows.sort(key=lambda row: row[3])
+        
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow([
+            "reservation_id", "user_id", "lot_id", "start_time", "end_time",
+            "total_cost", "status", "created_at", "archived"
+        ])
+        writer.writerows(rows)
+        
+        return Response(
+            content=output.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=finance_{start_date}_{end_date}.csv"}
+        )
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting finance data: {str(e)}")
+
+DASHBOARD_SECTIONS = {
+    "stats": lambda: get_admin_stats(),
+    "lots": lambda: get_all_lots_manage()["lots"],
+    "bookings": lambda: get_all_bookings()["bookings"],
+    "users": lambda: get_all_users(USERS_PAGE_SIZE, 0)["users"],
+    "analytics": lambda: get_analytics(),
+}
+# one connection per section, so a full dashboard loads in a single round
+DASHBOARD_MAX_CONNECTIONS = int(os.getenv("ADMIN_DASHBOARD_MAX_CONNECTIONS", str(len(DASHBOARD_SECTIONS))))
+
+# section -> (loaded_at, data)
+_dashboard_cache = {}
+_dashboard_generation = 0
+_dashboard_lock = threading.Lock()
+_section_locks = {section: threading.Lock() for section in DASHBOARD_SECTIONS}
+# shared by every dashboard request, so sections never hold more than this many connections per shard
+_dashboard_pool = ThreadPoolExecutor(max_workers=DASHBOARD_MAX_CONNECTIONS, thread_name_prefix="admin-dashboard")
+
+def invalidate_dashboard(ids=None):
+    global _dashboard_generation
+    with _dashboard_lock:
+        _dashboard_generation += 1
+        _dashboard_cache.clear()
+
+# driver bookings only age the cache by DASHBOARD_CACHE_SECONDS; admin writes to lots, users and
+# bookings invalidate it so the admin sees their own change
+events.subscribe(events.LOTS_CHANGED, invalidate_dashboard)
+
+def cached_section(section):
+    entry = _dashboard_cache.get(section)
+    if entry and time.monotonic() - entry[0] < DASHBOARD_CACHE_SECONDS:
+        return entry[1]
+    return None
+
+def load_section(section):
+    data = cached_section(section)
+    if data is not None:
+        return data
+    
+    # one request reloads an expired section while the others wait for its result
+    with _section_locks[section]:
+        data = cached_section(section)
+        if data is not None:
+            return data
+        
+        generation = _dashboard_generation
+        data = DASHBOARD_SECTIONS[section]()
+        with _dashboard_lock:
+            # a write that landed while the queries ran makes this result stale
+            if generation == _dashboard_generation:
+                _dashboard_cache[section] = (time.monotonic(), data)
+        return data
+
+def select_fields(data, fields):
+    if not fields:
+        return data
+    if isinstance(data, list):
+        return [{key: row[key] for key in fields if key in row} for row in data]
+    return {key: data[key] for key in fields if key in data}
+
+@router.get("/dashboard")
+def get_dashboard(sections: Optional[str] = None, fields: Optional[str] = None):
+    # sections=stats,lots limits the sections; fields=lots.lot_id,lots.lot_name limits a section's fields
+    requested = [section.strip() for section in sections.split(",") if section.strip()] if sections else list(DASHBOARD_SECTIONS)
+    unknown = [section for section in requested if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dashboard section: {', '.join(unknown)}")
+    if not requested:
+        raise HTTPException(status_code=400, detail="No dashboard sections requested")
+    
+    section_fields = {}
+    for item in (fields or "").split(","):
+        section, _, field = item.strip().partition(".")
+        if not field:
+            continue
+        if section not in DASHBOARD_SECTIONS:
+            raise HTTPException(status_code=400, detail=f"Unknown dashboard section: {section}")
+        section_fields.setdefault(section, []).append(field)
+    
+    # every section loads in parallel unless ADMIN_DASHBOARD_MAX_CONNECTIONS is set lower, then the rest queue
+    futures = {section: _dashboard_pool.submit(load_section, section) for section in requested}
+    
+    result = {"errors": {}}
+    for section, future in futures.items():
+        try:
+            result[section] = select_fields(future.result(), section_fields.get(section))
+        except HTTPException as e:
+            result[section] = None
+            result["errors"][section] = e.detail
+        except Exception as e:
+            result[section] = None
+            result["errors"][section] = str(e)
+    
+    return result
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from database import get_db
+from repository import get_repository, DatabaseUnavailableError
 import bcrypt
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
@@ -11,15 +11,9 @@ class LoginRequest(BaseModel):
 
 @router.post("/login")
 def login(req: LoginRequest):
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor(dictionary=True)
     try:
         email = req.email.strip()
-        cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
+        user = get_repository().get_user_by_email(email)
         
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -40,8 +34,7 @@ def login(req: LoginRequest):
         }
     except HTTPException:
         raise
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Login error: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
@@ -0,0 +1,110 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from repository import get_repository, DatabaseUnavailableError
+from database import shard_for_id
+from datetime import datetime
+from typing import Optional
+import events
+import plate_index
+import waitlist
+
+router = APIRouter(prefix="/gate", tags=["Gate"])
+
+class GateRead(BaseModel):
+    license_plate: str
+    lot_id: int
+    gate_id: Optional[str] = None
+
+def denied(plate, reason):
+    return {"allowed": False, "license_plate": plate, "reason": reason}
+
+@router.post("/check-in")
+def gate_check_in(data: GateRead):
+    plate = plate_index.normalize(data.license_plate)
+    now = datetime.now()
+
+    try:
+        plate_index.ensure_loaded()
+    except plate_index.IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    # the barrier decision comes from the in-memory index; unknown plates never reach the database
+    entry = plate_index.index.find_entry(plate, data.lot_id, now)
+    if not entry:
+        return denied(plate, "no_valid_reservation")
+
+    result = {
+        "allowed": True,
+        "license_plate": plate,
+        "reservation_id": entry["reservation_id"],
+        "user_id": entry["user_id"],
+        "end_time": entry["end_time"].isoformat(),
+    }
+    if not entry["checked_in_at"]:
+        # cameras read the same plate several times while the barrier opens; only the first read is recorded
+        plate_index.check_in(entry["reservation_id"], now)
+    return result
+
+@router.post("/check-out")
+def gate_check_out(data: GateRead):
+    plate = plate_index.normalize(data.license_plate)
+    now = datetime.now()
+
+    try:
+        plate_index.ensure_loaded()
+    except plate_index.IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    entry = plate_index.index.find_exit(plate, data.lot_id)
+    missed_check_in = False
+    if not entry:
+        # the entry read was missed or its write lost; a booking that is on now still lets the car out
+        entry = plate_index.index.find_entry(plate, data.lot_id, now)
+        missed_check_in = entry is not None
+    if not entry:
+        return denied(plate, "no_open_check_in")
+
+    try:
+        tx = get_repository().begin(shard_for_id(entry["reservation_id"]))
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        checked_in_at = plate_index.unsaved_check_in(entry["reservation_id"])
+        if checked_in_at:
+            # the exit was read before the check-in thread wrote the entry
+            tx.check_in_reservation(entry["reservation_id"], checked_in_at)
+        elif missed_check_in:
+            # the entry time is unknown, so the stay is recorded from the exit read
+            print(f"Reservation {entry['reservation_id']} checked out without a recorded check-in")
+            tx.check_in_reservation(entry["reservation_id"], now)
+        booking = tx.get_reservation(entry["reservation_id"])
+        if not booking or not tx.check_out_reservation(entry["reservation_id"], now):
+            tx.rollback()
+            plate_index.refresh([entry["reservation_id"]])
+            return denied(plate, "no_open_check_in")
+
+        allocation = None
+        if booking["status"] == "active":
+            # leaving before the booking ends frees the spot for the waitlist
+            allocation = waitlist.allocate_next(tx, booking["lot_id"])
+
+        tx.commit()
+        if checked_in_at:
+            plate_index.check_in_saved(entry["reservation_id"])
+        waitlist.notify([allocation])
+        events.publish(events.RESERVATIONS_CHANGED, [entry["reservation_id"]])
+
+        return {
+            "allowed": True,
+            "license_plate": plate,
+            "reservation_id": entry["reservation_id"],
+            "user_id": entry["user_id"],
+            "status": "completed",
+        }
+    except Exception as e:
+        tx.rollback()
+        waitlist.invalidate(entry["lot_id"])
+        raise HTTPException(status_code=500, detail=f"Error checking out: {str(e)}")
+    finally:
+        tx.close()
@@ -1,44 +1,57 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Header, Response
 from pydantic import BaseModel
-from database import get_db
+from database import mark_write, shard_for_id
+from repository import get_repository, DatabaseUnavailableError, LotFullError
 from datetime import datetime
+from typing import Optional
+import events
+import forecast
+import idempotency
+import last_known_good
+import profiling
+import search_index
+import waitlist
 
-router = APIRouter(prefix="/parking", tags=["Parking"])
+router = APIRouter(prefix="/parking", tags=["Parking"], route_class=profiling.ProfiledRoute)
 
 @router.get("/lots")
 def get_parking_lots():
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    cursor.execute(
-        "SELECT lot_id, lot_name, location, total_spots, available_spots, hourly_rate, status FROM parking_lots"
-    )
-    lots = cursor.fetchall()
-    cursor.close()
-    db.close()
+    try:
+        lots = get_repository().list_lots()
+    except DatabaseUnavailableError:
+        cached = last_known_good.get("lots")
+        if cached:
+            return last_known_good.stale({"parking_lots": cached[0]}, cached[1])
+        raise HTTPException(status_code=500, detail="Database connection failed")
 
     if not lots:
         raise HTTPException(status_code=404, detail="No parking lots found")
 
+    last_known_good.put_lots(lots)
     return {"parking_lots": lots}
 
+# declared before /lots/{lot_id} so "search" is not parsed as a lot id
+@router.get("/lots/search")
+def search_parking_lots(q: str = Query(..., min_length=1), limit: int = Query(search_index.DEFAULT_LIMIT, ge=1, le=search_index.MAX_LIMIT)):
+    try:
+        return {"parking_lots": search_index.search_lots(q, limit)}
+    except search_index.IndexNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
 @router.get("/lots/{lot_id}")
 def get_parking_lot(lot_id: int):
-    db = get_db()
-    cursor = db.cursor(dictionary=True)
-
-    cursor.execute(
-        "SELECT lot_id, lot_name, location, total_spots, available_spots, hourly_rate, status "
-        "FROM parking_lots WHERE lot_id = %s",
-        (lot_id,),
-    )
-    lot = cursor.fetchone()
-    cursor.close()
-    db.close()
+    try:
+        lot = get_repository().get_lot(lot_id)
+    except DatabaseUnavailableError:
+        cached = last_known_good.get(("lot", lot_id))
+        if cached:
+            return last_known_good.stale({"parking_lot": cached[0]}, cached[1])
+        raise HTTPException(status_code=500, detail="Database connection failed")
 
     if not lot:
         raise HTTPException(status_code=404, detail="Parking lot not found")
 
+    last_known_good.put(("lot", lot_id), lot)
     return {"parking_lot": lot}
 
 class BookingRequest(BaseModel):
@@ -46,82 +59,106 @@ class BookingRequest(BaseModel):
     lot_id: int
     start_time: str
     end_time: str
+    join_waitlist: bool = False
 
 @router.post("/book")
-def book_parking_spot(data: BookingRequest):
-    db = get_db()
-    cursor = db.cursor()
+def book_parking_spot(data: BookingRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    request_hash = None
+    if idempotency_key:
+        if len(idempotency_key) > idempotency.MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Idempotency-Key must be at most {idempotency.MAX_KEY_LENGTH} characters"
+            )
+        request_hash = idempotency.fingerprint(
+            data.user_id, data.lot_id, data.start_time, data.end_time, data.join_waitlist
+        )
+        try:
+            cached = idempotency.get_cached(idempotency_key, request_hash)
+        except idempotency.KeyReusedError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if cached is not None:
+            if "waitlist_entry" in cached:
+                response.status_code = 202
+            return cached
 
     try:
+        tx = get_repository().begin(shard_for_id(data.lot_id))
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        if idempotency_key and not idempotency.claim(tx, idempotency_key, data.user_id, request_hash):
+            # another request with this key already committed (or was committing) a booking
+            tx.rollback()
+            replay = idempotency.lookup(tx, idempotency_key, request_hash)
+            if replay is None:
+                raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+            if "waitlist_entry" in replay:
+                response.status_code = 202
+            return replay
+
         start_dt = datetime.strptime(data.start_time, "%Y-%m-%dT%H:%M")
         end_dt = datetime.strptime(data.end_time, "%Y-%m-%dT%H:%M")
 
-        cursor.execute("SET @p_total_cost = 0;")
-        cursor.callproc("make_reservation1", [data.user_id, data.lot_id, start_dt, end_dt, "@p_total_cost"])
-        cursor.execute("SELECT @p_total_cost;")
-        total_cost = cursor.fetchone()[0]
+        entry = None
+        try:
+            reservation_id, total_cost = tx.make_reservation(data.user_id, data.lot_id, start_dt, end_dt)
+
+            result = {
+                "message": "Parking booked successfully",
+                "booking_summary": {
+                    "reservation_id": reservation_id,
+                    "user_id": data.user_id,
+                    "lot_id": data.lot_id,
+                    "start_time": data.start_time,
+                    "end_time": data.end_time,
+                    "total_cost": float(total_cost),
+                },
+            }
+        except LotFullError:
+            if not data.join_waitlist or end_dt <= start_dt:
+                raise
+            entry = waitlist.enqueue(tx, data.user_id, data.lot_id, start_dt, end_dt)
+            result = {
+                "message": "Parking lot is full, you have been added to the waitlist",
+                "waitlist_entry": waitlist.describe(entry),
+                # allocations are not pushed to the driver; the client polls this until the entry is 'allocated'
+                "poll_url": f"/parking/waitlist/{data.user_id}",
+            }
+            response.status_code = 202
 
-        db.commit()
+        if idempotency_key:
+            idempotency.complete(tx, idempotency_key, result)
 
-        return {
-            "message": "Parking booked successfully",
-            "booking_summary": {
-                "user_id": data.user_id,
-                "lot_id": data.lot_id,
-                "start_time": data.start_time,
-                "end_time": data.end_time,
-                "total_cost": float(total_cost),
-            },
-        }
+        tx.commit()
+        mark_write(data.user_id)
+
+        if entry:
+            waitlist.track(entry)
+        else:
+            events.publish(events.RESERVATIONS_CHANGED, [reservation_id])
+        if idempotency_key:
+            idempotency.remember(idempotency_key, request_hash, result)
 
+        return result
+
+    except HTTPException:
+        raise
+    except idempotency.KeyReusedError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
-        db.rollback()
+        tx.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
     finally:
-        cursor.close()
-        db.close()
+        tx.close()
 
 @router.get("/bookings/{user_id}")
-def get_user_bookings(user_id: int):
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor(dictionary=True)
-    
+def get_user_bookings(user_id: int, include_archived: bool = Query(False)):
     try:
-        try:
-            cursor.execute("""
-                SELECT * FROM v_user_bookings
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-            """, (user_id,))
-            bookings = cursor.fetchall()
-        except:
-            cursor.execute("""
-                SELECT 
-                    r.reservation_id,
-                    r.user_id,
-                    u.name as user_name,
-                    u.email,
-                    r.lot_id,
-                    p.lot_name,
-                    p.location,
-                    r.start_time,
-                    r.end_time,
-                    TIMESTAMPDIFF(HOUR, r.start_time, r.end_time) as duration_hours,
-                    r.total_cost,
-                    r.status,
-                    r.created_at
-                FROM reservations r
-                JOIN users u ON r.user_id = u.user_id
-                JOIN parking_lots p ON r.lot_id = p.lot_id
-                WHERE r.user_id = %s
-                ORDER BY r.created_at DESC
-            """, (user_id,))
-            bookings = cursor.fetchall()
-        
+        bookings = get_repository().user_bookings(user_id, include_archived)
+
         for booking in bookings:
             if booking.get('start_time'):
                 booking['start_time'] = booking['start_time'].isoformat() if hasattr(booking['start_time'], 'isoformat') else str(booking['start_time'])
@@ -129,112 +166,143 @@ def get_user_bookings(user_id: int):
                 booking['end_time'] = booking['end_time'].isoformat() if hasattr(booking['end_time'], 'isoformat') else str(booking['end_time'])
             if booking.get('created_at'):
                 booking['created_at'] = booking['created_at'].isoformat() if hasattr(booking['created_at'], 'isoformat') else str(booking['created_at'])
-        
+
         return {"bookings": bookings}
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching bookings: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
 
 @router.get("/lots/{lot_id}/calculate-cost")
 def calculate_parking_cost(lot_id: int, start_time: str = Query(...), end_time: str = Query(...)):
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor()
-    
     try:
         start_dt = datetime.strptime(start_time, "%Y-%m-%dT%H:%M")
         end_dt = datetime.strptime(end_time, "%Y-%m-%dT%H:%M")
-        
-        cursor.execute("SELECT calculate_parking_cost(%s, %s, %s) as cost", (lot_id, start_dt, end_dt))
-        result = cursor.fetchone()
-        
+
+        cost = get_repository().calculate_cost(lot_id, start_dt, end_dt)
+
         return {
             "lot_id": lot_id,
             "start_time": start_time,
             "end_time": end_time,
-            "calculated_cost": float(result[0])
+            "calculated_cost": float(cost)
         }
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error calculating cost: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
 
 @router.get("/lots/{lot_id}/status")
 def get_lot_status(lot_id: int):
-    db = get_db()
-    if not db:
-        raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor(dictionary=True)
-    
     try:
-        cursor.execute("SELECT get_lot_status(%s) as status", (lot_id,))
-        status_result = cursor.fetchone()
-        
-        cursor.execute("SELECT check_available_spots(%s) as available", (lot_id,))
-        available_result = cursor.fetchone()
-        
-        return {
+        result = get_repository().lot_status(lot_id)
+
+        status = {
             "lot_id": lot_id,
-            "status": status_result["status"],
-            "available_spots": available_result["available"]
+            "status": result["status"],
+            "available_spots": result["available_spots"]
         }
+        last_known_good.put(("status", lot_id), status)
+        return status
+    except DatabaseUnavailableError:
+        cached = last_known_good.get(("status", lot_id))
+        if cached:
+            return last_known_good.stale(cached[0], cached[1])
+        raise HTTPException(status_code=500, detail="Database connection failed")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching status: {str(e)}")
-    finally:
-        cursor.close()
-        db.close()
+
+@router.get("/lots/{lot_id}/forecast")
+def get_lot_forecast(lot_id: int, at: str = Query(...)):
+    try:
+        at_dt = datetime.strptime(at, "%Y-%m-%dT%H:%M")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="at must be in YYYY-MM-DDTHH:MM format")
+
+    prediction = forecast.predict(lot_id, at_dt)
+    if prediction is None:
+        raise HTTPException(status_code=404, detail="No forecast available for this parking lot")
+
+    return {"forecast": prediction}
 
 @router.put("/bookings/{reservation_id}/cancel")
 def cancel_booking(reservation_id: int):
-    db = get_db()
-    if not db:
+    try:
+        tx = get_repository().begin(shard_for_id(reservation_id))
+    except DatabaseUnavailableError:
         raise HTTPException(status_code=500, detail="Database connection failed")
-    
-    cursor = db.cursor(dictionary=True)
-    
+
+    booking = None
     try:
-        cursor.execute("""
-            SELECT reservation_id, user_id, lot_id, status, start_time
-            FROM reservations
-            WHERE reservation_id = %s
-        """, (reservation_id,))
-        
-        booking = cursor.fetchone()
-        
+        booking = tx.get_reservation(reservation_id)
+
         if not booking:
             raise HTTPException(status_code=404, detail="Booking not found")
-        
+
         if booking['status'] == 'cancelled':
             raise HTTPException(status_code=400, detail="Booking is already cancelled")
-        
+
         if booking['status'] == 'completed':
             raise HTTPException(status_code=400, detail="Cannot cancel a completed booking")
-        
-        cursor.execute("""
-            UPDATE reservations
-            SET status = 'cancelled'
-            WHERE reservation_id = %s
-        """, (reservation_id,))
-        
-        db.commit()
-        
+
+        tx.set_reservation_status(reservation_id, 'cancelled')
+        allocation = waitlist.allocate_next(tx, booking['lot_id'])
+
+        tx.commit()
+        mark_write(booking['user_id'])
+        events.publish(events.RESERVATIONS_CHANGED, [reservation_id])
+        waitlist.notify([allocation])
+
         return {
             "message": "Booking cancelled successfully",
             "reservation_id": reservation_id,
             "status": "cancelled"
         }
-        
+
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        tx.rollback()
+        if booking:
+            waitlist.invalidate(booking['lot_id'])
         raise HTTPException(status_code=500, detail=f"Error cancelling booking: {str(e)}")
     finally:
-        cursor.close()
-        db.close()
+        tx.close()
+
+@router.get("/waitlist/{user_id}")
+def get_user_waitlist(user_id: int):
+    try:
+        entries = get_repository().user_waitlist(user_id)
+
+        for entry in entries:
+            for field in ('start_time', 'end_time', 'created_at', 'allocated_at'):
+                if entry.get(field):
+                    entry[field] = entry[field].isoformat() if hasattr(entry[field], 'isoformat') else str(entry[field])
+
+        return {"waitlist": entries}
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching waitlist: {str(e)}")
+
+@router.delete("/waitlist/{waitlist_id}")
+def leave_waitlist(waitlist_id: int):
+    try:
+        tx = get_repository().begin(shard_for_id(waitlist_id))
+    except DatabaseUnavailableError:
+        raise HTTPException(status_code=500, detail="Database connection failed")
+
+    try:
+        if not tx.set_waitlist_status(waitlist_id, 'cancelled', 'waiting'):
+            raise HTTPException(status_code=404, detail="No waiting entry found")
+
+        tx.commit()
+
+        return {"message": "Removed from waitlist", "waitlist_id": waitlist_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        tx.rollback()
+        raise HTTPException(status_code=500, detail=f"Error leaving waitlist: {str(e)}")
+    finally:
+        tx.close()
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+import math
+import sensor_buffer
+
+router = APIRouter(prefix="/sensors", tags=["Sensors"])
+
+class SensorEvent(BaseModel):
+    lot_id: int
+    spot_number: int
+    occupied: bool
+    observed_at: Optional[datetime] = None
+
+class SensorBatch(BaseModel):
+    events: List[SensorEvent]
+
+def observed_time(event, received_at):
+    if event.observed_at is None:
+        return received_at
+    if event.observed_at.tzinfo is not None:
+        # compare with naive local timestamps like the rest of the API
+        return event.observed_at.astimezone().replace(tzinfo=None)
+    return event.observed_at
+
+@router.post("/events", status_code=202)
+def ingest_sensor_events(data: SensorBatch):
+    # readings are buffered and written by the flush job, so this never waits on the database
+    received_at = datetime.now()
+    try:
+        queue_depth = sensor_buffer.ingest(
+            (event.lot_id, event.spot_number, event.occupied, observed_time(event, received_at))
+            for event in data.events
+        )
+    except sensor_buffer.BackpressureError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(sensor_buffer.FLUSH_SECONDS)))}
+        )
+
+    return {"accepted": len(data.events), "queue_depth": queue_depth}
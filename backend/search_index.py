@@ -0,0 +1,200 @@
+from repository import get_repository
+import bisect
+import events
+import os
+import re
+import threading
+import time
+
+# users created by scripts or other API processes only show up after a rebuild
+REBUILD_SECONDS = float(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", "300"))
+# lot change events naming more lots than this rebuild the lot index instead of reading each lot
+MAX_REFRESH_LOTS = int(os.getenv("SEARCH_INDEX_MAX_REFRESH_LOTS", "100"))
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def _terms(*values):
+    # the whole value and every word in it, so "smi" finds "John Smith" and "john s" finds it too
+    terms = set()
+    for value in values:
+        value = normalize(value)
+        if not value:
+            continue
+        terms.add(value)
+        terms.update(value.split(" "))
+    return terms
+
+
+def _user_terms(user):
+    # the email is matched from its start only; indexing the domain would put most users under "gmail"
+    return _terms(user["name"]) | _terms(user["email"])
+
+
+def _lot_terms(lot):
+    return _terms(lot["lot_name"], lot["location"])
+
+
+class IndexNotReadyError(Exception):
+    pass
+
+
+class PrefixIndex:
+    def __init__(self, fields, terms, id_field):
+        self.fields = fields
+        self.terms = terms
+        self.id_field = id_field
+        # sorted (term, id) pairs; the matches for a prefix are one contiguous run
+        self._keys = []
+        self._records = {}
+        self._lock = threading.Lock()
+        # puts and removes made while a rebuild's snapshot query runs, replayed onto the snapshot
+        self._pending = None
+        self._rebuild_lock = threading.Lock()
+        self.loaded = False
+
+    def _record(self, row):
+        return {field: row.get(field) for field in self.fields}
+
+    def rebuild(self, load):
+        with self._rebuild_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                rows = load()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+
+            records = {row[self.id_field]: self._record(row) for row in rows}
+            keys = sorted((term, record_id) for record_id, record in records.items() for term in self.terms(record))
+            with self._lock:
+                self._keys, self._records = keys, records
+                for record_id, record in self._pending:
+                    self._apply(record_id, record)
+                self._pending = None
+                self.loaded = True
+
+    def _remove(self, record_id):
+        record = self._records.pop(record_id, None)
+        if record is None:
+            return
+        for term in self.terms(record):
+            key = (term, record_id)
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def _apply(self, record_id, record):
+        # record None removes the entry
+        self._remove(record_id)
+        if record is None:
+            return
+        self._records[record_id] = record
+        for term in self.terms(record):
+            bisect.insort(self._keys, (term, record_id))
+
+    def _change(self, record_id, record):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((record_id, record))
+            # before the first load there is nothing to update; the load reads the change from the database
+            if self.loaded:
+                self._apply(record_id, record)
+
+    def put(self, record_id, row):
+        self._change(record_id, self._record(row))
+
+    def remove(self, record_id):
+        self._change(record_id, None)
+
+    def search(self, query, limit):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        with self._lock:
+            if not self.loaded:
+                raise IndexNotReadyError("Search index is still loading")
+            i = bisect.bisect_left(self._keys, (prefix,))
+            while i < len(self._keys) and len(results) < limit:
+                term, record_id = self._keys[i]
+                if not term.startswith(prefix):
+                    break
+                if record_id not in seen:
+                    seen.add(record_id)
+                    results.append(self._records[record_id])
+                i += 1
+        return results
+
+    def size(self):
+        with self._lock:
+            return len(self._records)
+
+
+users = PrefixIndex(("user_id", "name", "email", "role", "created_at"), _user_terms, "user_id")
+lots = PrefixIndex(("lot_id", "lot_name", "location", "status"), _lot_terms, "lot_id")
+
+
+def rebuild():
+    repo = get_repository()
+    users.rebuild(repo.list_users)
+    lots.rebuild(repo.list_lots)
+
+
+def search_users(query, limit=DEFAULT_LIMIT):
+    # the index is loaded by the background thread, never on a request thread
+    return users.search(query, limit)
+
+
+def search_lots(query, limit=DEFAULT_LIMIT):
+    return lots.search(query, limit)
+
+
+def put_user(user):
+    users.put(user["user_id"], user)
+
+
+def remove_user(user_id):
+    users.remove(user_id)
+
+
+def _on_lots_changed(lot_ids):
+    # read from the primary: a replica may not have the write that triggered the event yet
+    repo = get_repository()
+    if not lot_ids:
+        lots.rebuild(lambda: repo.list_lots(primary=True))
+        return
+    if len(lot_ids) > MAX_REFRESH_LOTS:
+        # a bulk update touching many lots is cheaper to reload in one pass
+        lots.rebuild(lambda: repo.list_lots(primary=True))
+        return
+    found = {lot["lot_id"]: lot for lot in repo.get_lots(lot_ids, primary=True)}
+    for lot_id in lot_ids:
+        if lot_id in found:
+            lots.put(lot_id, found[lot_id])
+        else:
+            lots.remove(lot_id)
+
+
+events.subscribe(events.LOTS_CHANGED, _on_lots_changed)
+
+
+def _rebuild_loop():
+    while True:
+        try:
+            rebuild()
+        except Exception as e:
+            print("Error rebuilding search index:", e)
+        # until the first load succeeds searches answer 503, so retry soon
+        time.sleep(REBUILD_SECONDS if users.loaded and lots.loaded else min(REBUILD_SECONDS, 5))
+
+
+def start():
+    threading.Thread(target=_rebuild_loop, name="search-index", daemon=True).start()
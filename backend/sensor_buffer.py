@@ -0,0 +1,227 @@
+from database import get_shard_db, shard_for_id
+from datetime import datetime
+import os
+import threading
+import time
+
+FLUSH_SECONDS = float(os.getenv("SENSOR_FLUSH_SECONDS", "1"))
+# distinct spots waiting for a flush; beyond this new spots are rejected until the buffer drains
+MAX_PENDING = int(os.getenv("SENSOR_MAX_PENDING", "50000"))
+FLUSH_CHUNK = int(os.getenv("SENSOR_FLUSH_CHUNK", "1000"))
+
+
+class BackpressureError(Exception):
+    pass
+
+
+class SensorBuffer:
+    def __init__(self, max_pending):
+        self.max_pending = max_pending
+        # (lot_id, spot_number) -> (is_occupied, observed_at), last write wins
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.received = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.rejected = 0
+
+    def add(self, events):
+        with self._lock:
+            new_spots = {key for key, _, _ in events if key not in self._pending}
+            if len(self._pending) + len(new_spots) > self.max_pending:
+                self.rejected += len(events)
+                raise BackpressureError("Sensor buffer is full")
+
+            for key, occupied, observed_at in events:
+                self.received += 1
+                current = self._pending.get(key)
+                if current is not None:
+                    if current[1] > observed_at:
+                        # delivered out of order, a newer reading is already queued
+                        self.stale += 1
+                        continue
+                    self.coalesced += 1
+                self._pending[key] = (occupied, observed_at)
+            return len(self._pending)
+
+    def take(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending):
+        # a failed flush puts its readings back unless newer ones arrived meanwhile
+        with self._lock:
+            for key, reading in pending.items():
+                current = self._pending.get(key)
+                if current is None or current[1] < reading[1]:
+                    self._pending[key] = reading
+
+    def depth(self):
+        with self._lock:
+            return len(self._pending)
+
+
+buffer = SensorBuffer(MAX_PENDING)
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    "flushes": 0,
+    "flush_errors": 0,
+    "spots_written": 0,
+    "spots_unchanged": 0,
+    "unknown_spots": 0,
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "last_flush_at": None,
+}
+
+
+def ingest(events):
+    # events: iterable of (lot_id, spot_number, occupied, observed_at)
+    return buffer.add([((lot_id, spot_number), bool(occupied), observed_at) for lot_id, spot_number, occupied, observed_at in events])
+
+
+def _flush_chunk(cursor, readings):
+    keys = list(readings)
+    pairs = ", ".join(["(%s, %s)"] * len(keys))
+    flat_keys = [value for key in keys for value in key]
+
+    # sensor state lives in its own columns: is_occupied and available_spots belong to the reservation
+    # triggers, and a car that booked and parked would otherwise be counted twice
+    cursor.execute(f"""
+        SELECT spot_id, lot_id, spot_number, sensor_occupied, sensor_observed_at FROM parking_spots
+        WHERE (lot_id, spot_number) IN ({pairs})
+        FOR UPDATE
+    """, flat_keys)
+    current = {(row[1], row[2]): row for row in cursor.fetchall()}
+
+    updates = []
+    touched_lots = set()
+    for key in keys:
+        if key not in current:
+            continue
+        spot_id, lot_id, _, stored, stored_at = current[key]
+        occupied, observed_at = readings[key]
+        # another API process may already have written a newer reading for this spot
+        if stored_at is not None and observed_at <= stored_at:
+            continue
+        updates.append((spot_id, occupied, observed_at))
+        # NULL until the spot's first reading
+        if stored is None or bool(stored) != occupied:
+            touched_lots.add(lot_id)
+
+    if updates:
+        cases = " ".join(["WHEN %s THEN %s"] * len(updates))
+        cursor.execute(f"""
+            UPDATE parking_spots
+            SET sensor_occupied = CASE spot_id {cases} END,
+                sensor_observed_at = CASE spot_id {cases} END
+            WHERE spot_id IN ({', '.join(['%s'] * len(updates))})
+        """, (
+            [value for spot_id, occupied, _ in updates for value in (spot_id, int(occupied))]
+            + [value for spot_id, _, observed_at in updates for value in (spot_id, observed_at)]
+            + [spot_id for spot_id, _, _ in updates]
+        ))
+
+    if touched_lots:
+        # counted from the spots rather than adjusted, so a lost or repeated flush cannot drift the total
+        cursor.execute(f"""
+            UPDATE parking_lots p
+            SET sensor_occupied_spots = (
+                SELECT COUNT(*) FROM parking_spots s WHERE s.lot_id = p.lot_id AND s.sensor_occupied = 1
+            )
+            WHERE p.lot_id IN ({', '.join(['%s'] * len(touched_lots))})
+        """, sorted(touched_lots))
+
+    return len(current), len(updates), len(keys) - len(current)
+
+
+def _flush_shard(shard_id, pending):
+    db = get_shard_db(shard_id)
+    if not db:
+        raise ConnectionError("Database connection failed")
+
+    cursor = db.cursor()
+    try:
+        found = written = unknown = 0
+        items = sorted(pending.items())
+        for i in range(0, len(items), FLUSH_CHUNK):
+            chunk_found, chunk_written, chunk_unknown = _flush_chunk(cursor, dict(items[i:i + FLUSH_CHUNK]))
+            found += chunk_found
+            written += chunk_written
+            unknown += chunk_unknown
+        db.commit()
+        return found, written, unknown
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.close()
+
+
+def flush():
+    pending = buffer.take()
+    if not pending:
+        return 0
+
+    # each lot's spots live on the lot's shard
+    by_shard = {}
+    for key, reading in pending.items():
+        by_shard.setdefault(shard_for_id(key[0]), {})[key] = reading
+
+    started = time.perf_counter()
+    found = written = unknown = 0
+    for shard_id, shard_pending in sorted(by_shard.items()):
+        try:
+            shard_found, shard_written, shard_unknown = _flush_shard(shard_id, shard_pending)
+        except Exception as e:
+            buffer.restore(shard_pending)
+            with _metrics_lock:
+                _metrics["flush_errors"] += 1
+            print(f"Error flushing sensor readings for shard {shard_id}:", e)
+            continue
+        found += shard_found
+        written += shard_written
+        unknown += shard_unknown
+
+    elapsed = (time.perf_counter() - started) * 1000
+    with _metrics_lock:
+        _metrics["flushes"] += 1
+        _metrics["spots_written"] += written
+        _metrics["spots_unchanged"] += found - written
+        _metrics["unknown_spots"] += unknown
+        _metrics["last_flush_ms"] = round(elapsed, 2)
+        _metrics["max_flush_ms"] = max(_metrics["max_flush_ms"], round(elapsed, 2))
+        _metrics["last_flush_at"] = datetime.now().isoformat()
+    return written
+
+
+def _flush_loop():
+    while True:
+        started = time.monotonic()
+        try:
+            flush()
+        except Exception as e:
+            print("Error flushing sensor readings:", e)
+        time.sleep(max(0.0, FLUSH_SECONDS - (time.monotonic() - started)))
+
+
+def start():
+    threading.Thread(target=_flush_loop, name="sensor-flush", daemon=True).start()
+
+
+def stats():
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    metrics.update({
+        "queue_depth": buffer.depth(),
+        "max_pending": buffer.max_pending,
+        "flush_interval_seconds": FLUSH_SECONDS,
+        "events_received": buffer.received,
+        "events_coalesced": buffer.coalesced,
+        "events_stale": buffer.stale,
+        "events_rejected": buffer.rejected,
+    })
+    return metrics
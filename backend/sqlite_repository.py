@@ -0,0 +1,466 @@
+from repository import (
+    ParkingRepository,
+    ParkingTransaction,
+    DatabaseUnavailableError,
+    ReservationError,
+    LotFullError,
+    LOT_COLUMNS,
+    RESERVATION_HISTORY_QUERY,
+    ARCHIVED_RESERVATION_HISTORY_QUERY,
+    GATE_RESERVATIONS_QUERY,
+    GATE_EXIT_WINDOW,
+)
+from datetime import datetime, timedelta
+from decimal import Decimal
+import math
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parking_lots (
+    lot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lot_name TEXT,
+    location TEXT,
+    total_spots INTEGER,
+    available_spots INTEGER,
+    hourly_rate REAL,
+    status TEXT DEFAULT 'open' CHECK (status IN ('open', 'closed'))
+);
+
+CREATE TABLE IF NOT EXISTS parking_spots (
+    spot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    lot_id INTEGER REFERENCES parking_lots(lot_id),
+    spot_number INTEGER,
+    is_occupied INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_spots_lot ON parking_spots (lot_id, is_occupied);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    password_hash TEXT NOT NULL,
+    role TEXT DEFAULT 'driver' CHECK (role IN ('driver', 'admin')),
+    created_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS vehicles (
+    vehicle_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    license_plate TEXT NOT NULL,
+    vehicle_type TEXT DEFAULT 'car',
+    created_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS reservations (
+    reservation_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    lot_id INTEGER NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    total_cost REAL NOT NULL,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'completed', 'cancelled')),
+    created_at TIMESTAMP,
+    sync_status TEXT DEFAULT 'pending' CHECK (sync_status IN ('pending', 'synced', 'rejected')),
+    checked_in_at DATETIME,
+    checked_out_at DATETIME,
+    upstream_reservation_id INTEGER,
+    synced_status TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_user ON reservations (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_reservations_lot ON reservations (lot_id, status);
+CREATE INDEX IF NOT EXISTS idx_reservations_sync ON reservations (sync_status);
+CREATE INDEX IF NOT EXISTS idx_reservations_status_end ON reservations (status, end_time);
+
+CREATE TABLE IF NOT EXISTS reservations_archive (
+    reservation_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    lot_id INTEGER NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    total_cost REAL NOT NULL,
+    status TEXT NOT NULL,
+    created_at TIMESTAMP,
+    archived_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    waitlist_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    lot_id INTEGER NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'waiting' CHECK (status IN ('waiting', 'allocated', 'expired', 'cancelled')),
+    reservation_id INTEGER,
+    created_at TIMESTAMP,
+    allocated_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_waitlist_lot ON waitlist (lot_id, status);
+CREATE INDEX IF NOT EXISTS idx_waitlist_user ON waitlist (user_id, created_at);
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idem_key TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    request_hash TEXT NOT NULL,
+    response TEXT,
+    created_at TIMESTAMP
+);
+"""
+
+USER_BOOKINGS_QUERY = """
+    SELECT
+        r.reservation_id,
+        r.user_id,
+        u.name as user_name,
+        u.email,
+        r.lot_id,
+        p.lot_name,
+        p.location,
+        r.start_time,
+        r.end_time,
+        (strftime('%s', r.end_time) - strftime('%s', r.start_time)) / 3600 as duration_hours,
+        r.total_cost,
+        r.status,
+        r.created_at
+    FROM {table} r
+    JOIN users u ON r.user_id = u.user_id
+    LEFT JOIN parking_lots p ON r.lot_id = p.lot_id
+    WHERE r.user_id = ?
+    ORDER BY r.created_at DESC
+"""
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(Decimal, float)
+sqlite3.register_converter("DATETIME", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+def _dict_factory(cursor, row):
+    return {column[0]: row[i] for i, column in enumerate(cursor.description)}
+
+
+def parking_cost(hourly_rate, start_time, end_time):
+    # same rounding as calculate_parking_cost: whole minutes, then up to the next hour
+    minutes = int((end_time - start_time).total_seconds() // 60)
+    return round(math.ceil(minutes / 60.0) * hourly_rate, 2)
+
+
+class SQLiteTransaction(ParkingTransaction):
+    def __init__(self, conn):
+        self.conn = conn
+        self.active = True
+        # take the write lock up front so concurrent bookings serialise like InnoDB row locks
+        self.conn.execute("BEGIN IMMEDIATE")
+
+    def _one(self, query, params=()):
+        return self.conn.execute(query, params).fetchone()
+
+    def _occupy_spot(self, lot_id):
+        # after_reservation_insert
+        self.conn.execute(
+            "UPDATE parking_lots SET available_spots = available_spots - 1 WHERE lot_id = ?", (lot_id,)
+        )
+        self.conn.execute("""
+            UPDATE parking_spots SET is_occupied = 1
+            WHERE spot_id = (SELECT spot_id FROM parking_spots WHERE lot_id = ? AND is_occupied = 0 LIMIT 1)
+        """, (lot_id,))
+
+    def _release_spot(self, lot_id):
+        # after_reservation_update / after_reservation_delete for reservations leaving 'active'
+        self.conn.execute(
+            "UPDATE parking_lots SET available_spots = available_spots + 1 WHERE lot_id = ?", (lot_id,)
+        )
+        self.conn.execute("""
+            UPDATE parking_spots SET is_occupied = 0
+            WHERE spot_id = (SELECT spot_id FROM parking_spots WHERE lot_id = ? AND is_occupied = 1 LIMIT 1)
+        """, (lot_id,))
+
+    def make_reservation(self, user_id, lot_id, start_time, end_time):
+        # make_reservation1
+        lot = self._one(
+            "SELECT hourly_rate, available_spots, status FROM parking_lots WHERE lot_id = ?", (lot_id,)
+        )
+        if not lot or lot["hourly_rate"] is None:
+            raise ReservationError("Parking lot not found")
+        if lot["status"] != "open":
+            raise ReservationError("Parking lot is closed")
+        if lot["available_spots"] <= 0:
+            raise LotFullError("No parking spots available")
+        if end_time <= start_time:
+            raise ReservationError("End time must be after start time")
+
+        total_cost = parking_cost(lot["hourly_rate"], start_time, end_time)
+        cursor = self.conn.execute("""
+            INSERT INTO reservations (user_id, lot_id, start_time, end_time, total_cost, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'active', ?)
+        """, (user_id, lot_id, start_time, end_time, total_cost, datetime.now()))
+        self._occupy_spot(lot_id)
+        return cursor.lastrowid, total_cost
+
+    def get_reservation(self, reservation_id):
+        return self._one("""
+            SELECT reservation_id, user_id, lot_id, status, start_time, end_time
+            FROM reservations
+            WHERE reservation_id = ?
+        """, (reservation_id,))
+
+    def set_reservation_status(self, reservation_id, status):
+        booking = self.get_reservation(reservation_id)
+        if not booking:
+            return
+        self.conn.execute(
+            "UPDATE reservations SET status = ? WHERE reservation_id = ?", (status, reservation_id)
+        )
+        if booking["status"] == "active" and status != "active":
+            self._release_spot(booking["lot_id"])
+
+    def delete_reservation(self, reservation_id):
+        booking = self.get_reservation(reservation_id)
+        if not booking:
+            return
+        self.conn.execute("DELETE FROM reservations WHERE reservation_id = ?", (reservation_id,))
+        if booking["status"] == "active":
+            self._release_spot(booking["lot_id"])
+
+    def ended_reservations(self, now):
+        return self.conn.execute("""
+            SELECT reservation_id, user_id, lot_id
+            FROM reservations
+            WHERE status = 'active' AND end_time <= ?
+        """, (now,)).fetchall()
+
+    def check_in_reservation(self, reservation_id, at):
+        cursor = self.conn.execute("""
+            UPDATE reservations SET checked_in_at = ?
+            WHERE reservation_id = ? AND status = 'active' AND checked_in_at IS NULL
+        """, (at, reservation_id))
+        if cursor.rowcount == 1:
+            return True
+        row = self._one(
+            "SELECT checked_in_at FROM reservations WHERE reservation_id = ? AND status != 'cancelled'", (reservation_id,)
+        )
+        return bool(row and row["checked_in_at"])
+
+    def check_out_reservation(self, reservation_id, at):
+        booking = self.get_reservation(reservation_id)
+        cursor = self.conn.execute("""
+            UPDATE reservations SET status = 'completed', checked_out_at = ?
+            WHERE reservation_id = ? AND status != 'cancelled'
+              AND checked_in_at IS NOT NULL AND checked_out_at IS NULL
+        """, (at, reservation_id))
+        if cursor.rowcount != 1:
+            return False
+        if booking["status"] == "active":
+            self._release_spot(booking["lot_id"])
+        return True
+
+    def add_waitlist_entry(self, user_id, lot_id, start_time, end_time, priority=0):
+        cursor = self.conn.execute("""
+            INSERT INTO waitlist (user_id, lot_id, start_time, end_time, priority, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (user_id, lot_id, start_time, end_time, priority, datetime.now()))
+        return cursor.lastrowid
+
+    def find_waitlist_entry(self, user_id, lot_id, start_time, end_time):
+        return self._one("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, created_at
+            FROM waitlist
+            WHERE user_id = ? AND lot_id = ? AND start_time = ? AND end_time = ? AND status = 'waiting'
+        """, (user_id, lot_id, start_time, end_time))
+
+    def count_waiting(self, lot_id):
+        return self._one(
+            "SELECT COUNT(*) as waiting FROM waitlist WHERE lot_id = ? AND status = 'waiting'", (lot_id,)
+        )["waiting"]
+
+    def waiting_entries(self, lot_id):
+        return self.conn.execute("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, created_at
+            FROM waitlist
+            WHERE lot_id = ? AND status = 'waiting'
+        """, (lot_id,)).fetchall()
+
+    def lots_to_allocate(self):
+        return self.conn.execute("""
+            SELECT p.lot_id, p.available_spots
+            FROM parking_lots p
+            WHERE p.status = 'open' AND p.available_spots > 0
+              AND EXISTS (SELECT 1 FROM waitlist w WHERE w.lot_id = p.lot_id AND w.status = 'waiting')
+        """).fetchall()
+
+    def set_waitlist_status(self, waitlist_id, status, from_status):
+        cursor = self.conn.execute(
+            "UPDATE waitlist SET status = ? WHERE waitlist_id = ? AND status = ?", (status, waitlist_id, from_status)
+        )
+        return cursor.rowcount == 1
+
+    def complete_waitlist_entry(self, waitlist_id, reservation_id):
+        self.conn.execute(
+            "UPDATE waitlist SET reservation_id = ?, allocated_at = ? WHERE waitlist_id = ?",
+            (reservation_id, datetime.now(), waitlist_id),
+        )
+
+    def get_idempotency_record(self, key, ttl_seconds):
+        return self._one("""
+            SELECT request_hash, response FROM idempotency_keys
+            WHERE idem_key = ? AND created_at >= ?
+        """, (key, datetime.now() - timedelta(seconds=ttl_seconds)))
+
+    def claim_idempotency_key(self, key, user_id, request_hash, ttl_seconds):
+        self.conn.execute(
+            "DELETE FROM idempotency_keys WHERE idem_key = ? AND created_at < ?",
+            (key, datetime.now() - timedelta(seconds=ttl_seconds)),
+        )
+        try:
+            self.conn.execute("""
+                INSERT INTO idempotency_keys (idem_key, user_id, request_hash, created_at)
+                VALUES (?, ?, ?, ?)
+            """, (key, user_id, request_hash, datetime.now()))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def complete_idempotency_key(self, key, response_json):
+        self.conn.execute(
+            "UPDATE idempotency_keys SET response = ? WHERE idem_key = ?", (response_json, key)
+        )
+
+    def commit(self):
+        if self.active:
+            self.conn.execute("COMMIT")
+            self.active = False
+
+    def rollback(self):
+        if self.active:
+            self.conn.execute("ROLLBACK")
+            self.active = False
+
+    def close(self):
+        self.rollback()
+        self.conn.close()
+
+
+class SQLiteRepository(ParkingRepository):
+    def __init__(self, path):
+        self.path = path
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        self._migrate(conn)
+        conn.close()
+
+    def _migrate(self, conn):
+        # CREATE TABLE IF NOT EXISTS leaves kiosk databases from older releases without newer columns
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(reservations)").fetchall()}
+        added = {
+            "checked_in_at": "DATETIME",
+            "checked_out_at": "DATETIME",
+            "upstream_reservation_id": "INTEGER",
+            "synced_status": "TEXT",
+        }
+        for column, column_type in added.items():
+            if column not in columns:
+                conn.execute(f"ALTER TABLE reservations ADD COLUMN {column} {column_type}")
+
+    def connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=10,
+            isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+        )
+        conn.row_factory = _dict_factory
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _open(self):
+        # routes handle an unreachable database through DatabaseUnavailableError, as with MySQL
+        try:
+            return self.connect()
+        except sqlite3.Error as e:
+            raise DatabaseUnavailableError(str(e))
+
+    def _fetch(self, query, params=(), one=False):
+        conn = self._open()
+        try:
+            cursor = conn.execute(query, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+        finally:
+            conn.close()
+
+    def list_lots(self, primary=False):
+        return self._fetch(f"SELECT {LOT_COLUMNS} FROM parking_lots")
+
+    def get_lot(self, lot_id, primary=False):
+        return self._fetch(f"SELECT {LOT_COLUMNS} FROM parking_lots WHERE lot_id = ?", (lot_id,), one=True)
+
+    def get_lots(self, lot_ids, primary=False):
+        lot_ids = sorted(set(lot_ids))
+        return self._fetch(f"SELECT {LOT_COLUMNS} FROM parking_lots WHERE lot_id IN ({', '.join(['?'] * len(lot_ids))})", lot_ids)
+
+    def calculate_cost(self, lot_id, start_time, end_time):
+        # calculate_parking_cost returns 0 for unknown lots rather than failing
+        lot = self.get_lot(lot_id)
+        if not lot or lot["hourly_rate"] is None:
+            return 0.0
+        return parking_cost(lot["hourly_rate"], start_time, end_time)
+
+    def lot_status(self, lot_id):
+        # get_lot_status and check_available_spots
+        lot = self.get_lot(lot_id)
+        if not lot:
+            # get_lot_status reports an unknown lot as available with no spots
+            return {"status": "available", "available_spots": 0}
+        available = lot["available_spots"] if lot["available_spots"] is not None else 0
+        if lot["status"] == "closed":
+            status = "closed"
+        elif available <= 0:
+            status = "full"
+        else:
+            status = "available"
+        return {"status": status, "available_spots": available}
+
+    def user_bookings(self, user_id, include_archived=False):
+        bookings = self._fetch(USER_BOOKINGS_QUERY.format(table="reservations"), (user_id,))
+        if include_archived:
+            bookings.extend(self._fetch(USER_BOOKINGS_QUERY.format(table="reservations_archive"), (user_id,)))
+        return bookings
+
+    def get_user_by_email(self, email):
+        return self._fetch("SELECT * FROM users WHERE email = ?", (email,), one=True)
+
+    def list_users(self):
+        return self._fetch("SELECT user_id, name, email, role, created_at FROM users")
+
+    def reservation_history(self, since_ids=None, include_archived=False):
+        rows = self._fetch(RESERVATION_HISTORY_QUERY.replace("%s", "?"), ((since_ids or {}).get(0, 0),))
+        if include_archived:
+            rows.extend(self._fetch(ARCHIVED_RESERVATION_HISTORY_QUERY))
+        return rows
+
+    def user_waitlist(self, user_id):
+        return self._fetch("""
+            SELECT waitlist_id, user_id, lot_id, start_time, end_time, priority, status,
+                   reservation_id, created_at, allocated_at
+            FROM waitlist
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+        """, (user_id,))
+
+    def gate_reservations(self, now, reservation_ids=None):
+        query = GATE_RESERVATIONS_QUERY.replace("%s", "?")
+        params = [now, now - GATE_EXIT_WINDOW]
+        if reservation_ids is not None:
+            query += f" AND r.reservation_id IN ({', '.join(['?'] * len(reservation_ids))})"
+            params.extend(reservation_ids)
+        return self._fetch(query, params)
+
+    def begin(self, shard_id=0):
+        conn = self._open()
+        try:
+            return SQLiteTransaction(conn)
+        except sqlite3.Error as e:
+            # BEGIN IMMEDIATE gave up waiting for the write lock
+            conn.close()
+            raise DatabaseUnavailableError(str(e))
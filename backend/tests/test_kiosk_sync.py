@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+from kiosk_sync import push_reservations
+from sqlite_repository import SQLiteRepository
+import pytest
+
+START = datetime(2026, 1, 5, 9, 0)
+
+
+@pytest.fixture
+def local(tmp_path):
+    return SQLiteRepository(str(tmp_path / "kiosk.db"))
+
+
+@pytest.fixture
+def remote(tmp_path):
+    return SQLiteRepository(str(tmp_path / "upstream.db"))
+
+
+def add_lot(repo, total_spots=2):
+    conn = repo.connect()
+    try:
+        conn.execute("""
+            INSERT INTO parking_lots (lot_id, lot_name, location, total_spots, available_spots, hourly_rate, status)
+            VALUES (1, 'Lot A', 'North', ?, ?, 4.0, 'open')
+        """, (total_spots, total_spots))
+    finally:
+        conn.close()
+
+
+def book(repo):
+    tx = repo.begin()
+    reservation_id, _ = tx.make_reservation(1, 1, START, START + timedelta(hours=1))
+    tx.commit()
+    tx.close()
+    return reservation_id
+
+
+def set_status(repo, reservation_id, status):
+    tx = repo.begin()
+    tx.set_reservation_status(reservation_id, status)
+    tx.commit()
+    tx.close()
+
+
+def upstream_reservations(remote):
+    return remote._fetch("SELECT reservation_id, status FROM reservations ORDER BY reservation_id")
+
+
+@pytest.fixture
+def lots(local, remote):
+    add_lot(local)
+    add_lot(remote)
+
+
+def test_push_after_a_lost_local_update_does_not_book_twice(local, remote, lots):
+    reservation_id = book(local)
+    assert push_reservations(local, remote, "gate-1") == (1, 0, 0)
+
+    # the kiosk crashed after the upstream commit, before recording the push
+    conn = local.connect()
+    conn.execute("UPDATE reservations SET sync_status = 'pending' WHERE reservation_id = ?", (reservation_id,))
+    conn.close()
+
+    assert push_reservations(local, remote, "gate-1") == (1, 0, 0)
+    assert upstream_reservations(remote) == [{"reservation_id": 1, "status": "active"}]
+    assert remote.get_lot(1)["available_spots"] == 1
+
+
+def test_cancellation_is_pushed_once(local, remote, lots):
+    reservation_id = book(local)
+    push_reservations(local, remote, "gate-1")
+
+    set_status(local, reservation_id, "cancelled")
+    assert push_reservations(local, remote, "gate-1") == (0, 0, 1)
+    assert push_reservations(local, remote, "gate-1") == (0, 0, 0)
+
+    assert upstream_reservations(remote) == [{"reservation_id": 1, "status": "cancelled"}]
+    assert remote.get_lot(1)["available_spots"] == 2
+
+
+def test_reservation_cancelled_before_its_push_is_not_booked(local, remote, lots):
+    reservation_id = book(local)
+    set_status(local, reservation_id, "cancelled")
+
+    assert push_reservations(local, remote, "gate-1") == (0, 0, 0)
+    assert upstream_reservations(remote) == []
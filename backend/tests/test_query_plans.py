@@ -0,0 +1,25 @@
+from check_query_plans import check_query_plans, extract_statements
+from database import get_db
+import os
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_dynamic_statements_are_rendered():
+    statements = extract_statements(BACKEND_DIR)
+    labels = {label for label, line, sql in statements}
+
+    assert all(sql is not None for label, line, sql in statements)
+    assert not any("{" in sql for label, line, sql in statements)
+    assert "repository.py:SHARD_USER_BOOKINGS_QUERY[reservations_archive]" in labels
+    assert "routes/admin.py:bulk_update_shard" in labels
+
+
+def test_query_plans():
+    db = get_db()
+    if not db:
+        pytest.skip("MySQL is not reachable")
+    db.close()
+
+    assert check_query_plans()
@@ -0,0 +1,58 @@
+from search_index import PrefixIndex, IndexNotReadyError, _user_terms
+import pytest
+
+
+def user(user_id, name, email):
+    return {"user_id": user_id, "name": name, "email": email, "role": "driver", "created_at": None}
+
+
+@pytest.fixture
+def index():
+    return PrefixIndex(("user_id", "name", "email"), _user_terms, "user_id")
+
+
+def ids(results):
+    return [row["user_id"] for row in results]
+
+
+def test_search_before_the_first_load_is_not_ready(index):
+    with pytest.raises(IndexNotReadyError):
+        index.search("jo", 10)
+
+
+def test_prefix_matches_any_word_of_the_name_or_the_email(index):
+    index.rebuild(lambda: [user(1, "John Smith", "john@example.com"), user(2, "Ann Smithers", "ann@example.com")])
+
+    assert ids(index.search("smi", 10)) == [1, 2]
+    assert ids(index.search("john s", 10)) == [1]
+    assert ids(index.search("ann@", 10)) == [2]
+    assert ids(index.search("example", 10)) == []
+
+
+def test_changes_made_during_a_rebuild_survive_it(index):
+    index.rebuild(lambda: [user(1, "John Smith", "john@example.com"), user(2, "Ann Lee", "ann@example.com")])
+
+    def load():
+        # the snapshot was read before these writes committed
+        index.put(3, user(3, "Joan Park", "joan@example.com"))
+        index.remove(2)
+        return [user(1, "John Smith", "john@example.com"), user(2, "Ann Lee", "ann@example.com")]
+
+    index.rebuild(load)
+
+    assert ids(index.search("jo", 10)) == [3, 1]
+    assert index.search("ann", 10) == []
+    assert index.size() == 2
+
+
+def test_failed_rebuild_keeps_serving_the_old_entries(index):
+    index.rebuild(lambda: [user(1, "John Smith", "john@example.com")])
+
+    def load():
+        raise ConnectionError("Database connection failed")
+
+    with pytest.raises(ConnectionError):
+        index.rebuild(load)
+    index.put(2, user(2, "Joan Park", "joan@example.com"))
+
+    assert ids(index.search("jo", 10)) == [2, 1]
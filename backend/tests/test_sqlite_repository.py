@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+from repository import ReservationError, LotFullError, DatabaseUnavailableError, ParkingRepository, GATE_EXIT_WINDOW
+from sqlite_repository import SQLiteRepository
+import pytest
+
+START = datetime(2026, 1, 5, 9, 0)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    return SQLiteRepository(str(tmp_path / "parking.db"))
+
+
+def add_lot(repo, total_spots=2, available_spots=None, hourly_rate=4.0, status="open"):
+    conn = repo.connect()
+    try:
+        lot_id = conn.execute("""
+            INSERT INTO parking_lots (lot_name, location, total_spots, available_spots, hourly_rate, status)
+            VALUES ('Lot A', 'North', ?, ?, ?, ?)
+        """, (total_spots, total_spots if available_spots is None else available_spots, hourly_rate, status)).lastrowid
+        conn.executemany(
+            "INSERT INTO parking_spots (lot_id, spot_number) VALUES (?, ?)",
+            [(lot_id, number) for number in range(1, total_spots + 1)],
+        )
+        return lot_id
+    finally:
+        conn.close()
+
+
+def reserve(repo, lot_id, start_time=START, end_time=START + timedelta(hours=2), user_id=1):
+    tx = repo.begin()
+    try:
+        result = tx.make_reservation(user_id, lot_id, start_time, end_time)
+        tx.commit()
+        return result
+    finally:
+        tx.close()
+
+
+def occupied_spots(repo, lot_id):
+    return repo._fetch(
+        "SELECT COUNT(*) as occupied FROM parking_spots WHERE lot_id = ? AND is_occupied = 1", (lot_id,), one=True
+    )["occupied"]
+
+
+def test_get_lots_reads_only_the_given_lots(repo):
+    first, second, _ = add_lot(repo), add_lot(repo), add_lot(repo)
+
+    lots = repo.get_lots([second, first, first, 999])
+
+    assert sorted(lot["lot_id"] for lot in lots) == [first, second]
+
+
+def test_make_reservation_charges_started_hours(repo):
+    lot_id = add_lot(repo, hourly_rate=4.0)
+
+    reservation_id, total_cost = reserve(repo, lot_id, end_time=START + timedelta(hours=2, minutes=1))
+
+    assert total_cost == 12.0
+    assert repo._fetch(
+        "SELECT status FROM reservations WHERE reservation_id = ?", (reservation_id,), one=True
+    )["status"] == "active"
+    assert repo.get_lot(lot_id)["available_spots"] == 1
+    assert occupied_spots(repo, lot_id) == 1
+
+
+def test_make_reservation_rejects_closed_lot(repo):
+    lot_id = add_lot(repo, status="closed")
+
+    with pytest.raises(ReservationError, match="closed"):
+        reserve(repo, lot_id)
+    assert repo.get_lot(lot_id)["available_spots"] == 2
+
+
+def test_make_reservation_rejects_full_lot(repo):
+    lot_id = add_lot(repo, total_spots=1)
+    reserve(repo, lot_id)
+
+    with pytest.raises(LotFullError):
+        reserve(repo, lot_id)
+    assert repo.get_lot(lot_id)["available_spots"] == 0
+
+
+def test_make_reservation_rejects_end_before_start(repo):
+    lot_id = add_lot(repo)
+
+    with pytest.raises(ReservationError, match="End time"):
+        reserve(repo, lot_id, end_time=START - timedelta(hours=1))
+    assert repo.get_lot(lot_id)["available_spots"] == 2
+
+
+def test_make_reservation_rejects_unknown_lot(repo):
+    with pytest.raises(ReservationError, match="not found"):
+        reserve(repo, 999)
+
+
+@pytest.mark.parametrize("status", ["cancelled", "completed"])
+def test_leaving_active_releases_the_spot_once(repo, status):
+    lot_id = add_lot(repo)
+    reservation_id, _ = reserve(repo, lot_id)
+
+    for _ in range(2):
+        tx = repo.begin()
+        tx.set_reservation_status(reservation_id, status)
+        tx.commit()
+        tx.close()
+
+    assert repo.get_lot(lot_id)["available_spots"] == 2
+    assert occupied_spots(repo, lot_id) == 0
+
+
+def test_check_out_releases_the_spot(repo):
+    lot_id = add_lot(repo)
+    reservation_id, _ = reserve(repo, lot_id)
+
+    tx = repo.begin()
+    assert not tx.check_out_reservation(reservation_id, START)
+    assert tx.check_in_reservation(reservation_id, START)
+    assert tx.check_out_reservation(reservation_id, START + timedelta(hours=1))
+    tx.commit()
+    tx.close()
+
+    assert repo.get_lot(lot_id)["available_spots"] == 2
+
+
+def test_repeated_check_in_succeeds_without_moving_the_check_in_time(repo):
+    lot_id = add_lot(repo)
+    reservation_id, _ = reserve(repo, lot_id)
+
+    tx = repo.begin()
+    assert tx.check_in_reservation(reservation_id, START)
+    assert tx.check_in_reservation(reservation_id, START + timedelta(minutes=1))
+    tx.commit()
+    tx.close()
+
+    assert repo._fetch(
+        "SELECT checked_in_at FROM reservations WHERE reservation_id = ?", (reservation_id,), one=True
+    )["checked_in_at"] == START
+
+
+def test_check_in_of_cancelled_reservation_fails(repo):
+    lot_id = add_lot(repo)
+    reservation_id, _ = reserve(repo, lot_id)
+
+    tx = repo.begin()
+    tx.set_reservation_status(reservation_id, "cancelled")
+    assert not tx.check_in_reservation(reservation_id, START)
+    tx.commit()
+    tx.close()
+
+
+def test_gate_reservations_drop_cars_left_inside_past_the_exit_window(repo):
+    lot_id = add_lot(repo)
+    conn = repo.connect()
+    conn.execute("INSERT INTO users (user_id, name, email, password_hash) VALUES (1, 'Driver', 'driver@example.com', 'x')")
+    conn.execute("INSERT INTO vehicles (user_id, license_plate) VALUES (1, 'KA01AB1234')")
+    conn.close()
+    recent, _ = reserve(repo, lot_id)
+    forgotten, _ = reserve(repo, lot_id, start_time=START - timedelta(days=3), end_time=START - timedelta(days=2))
+
+    tx = repo.begin()
+    for reservation_id in (recent, forgotten):
+        tx.check_in_reservation(reservation_id, START - timedelta(days=3))
+        tx.set_reservation_status(reservation_id, "completed")
+    tx.commit()
+    tx.close()
+
+    now = START + timedelta(hours=2) + GATE_EXIT_WINDOW / 2
+    assert [row["reservation_id"] for row in repo.gate_reservations(now)] == [recent]
+
+
+def test_deleting_an_active_reservation_releases_the_spot(repo):
+    lot_id = add_lot(repo)
+    reservation_id, _ = reserve(repo, lot_id)
+
+    tx = repo.begin()
+    tx.delete_reservation(reservation_id)
+    tx.commit()
+    tx.close()
+
+    assert repo.get_lot(lot_id)["available_spots"] == 2
+
+
+def test_lot_status(repo):
+    open_lot = add_lot(repo)
+    full_lot = add_lot(repo, total_spots=1, available_spots=0)
+    closed_lot = add_lot(repo, status="closed")
+
+    assert repo.lot_status(open_lot) == {"status": "available", "available_spots": 2}
+    assert repo.lot_status(full_lot) == {"status": "full", "available_spots": 0}
+    assert repo.lot_status(closed_lot) == {"status": "closed", "available_spots": 2}
+
+
+def test_lot_status_of_unknown_lot_matches_mysql(repo):
+    assert repo.lot_status(999) == {"status": "available", "available_spots": 0}
+
+
+def test_unreachable_database_raises_database_unavailable(repo, tmp_path):
+    repo.path = str(tmp_path / "missing" / "parking.db")
+
+    with pytest.raises(DatabaseUnavailableError):
+        repo.begin()
+    with pytest.raises(DatabaseUnavailableError):
+        repo.list_lots()
+
+
+def test_repository_without_every_method_cannot_be_created():
+    class PartialRepository(ParkingRepository):
+        def list_lots(self, primary=False):
+            return []
+
+    with pytest.raises(TypeError):
+        PartialRepository()
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from sqlite_repository import SQLiteRepository
+import pytest
+import waitlist
+
+
+@pytest.fixture
+def repo(tmp_path):
+    repo = SQLiteRepository(str(tmp_path / "parking.db"))
+    conn = repo.connect()
+    conn.execute("""
+        INSERT INTO parking_lots (lot_id, lot_name, location, total_spots, available_spots, hourly_rate, status)
+        VALUES (1, 'Lot A', 'North', 1, 1, 4.0, 'open')
+    """)
+    conn.close()
+    waitlist.invalidate(1)
+    return repo
+
+
+def add_waiting(repo, user_id, start_time, end_time):
+    # as written by another API process; this process's heap never saw it
+    conn = repo.connect()
+    try:
+        return conn.execute("""
+            INSERT INTO waitlist (user_id, lot_id, start_time, end_time, created_at)
+            VALUES (?, 1, ?, ?, ?)
+        """, (user_id, start_time, end_time, datetime.now())).lastrowid
+    finally:
+        conn.close()
+
+
+def waitlist_status(repo, waitlist_id):
+    return repo._fetch("SELECT status FROM waitlist WHERE waitlist_id = ?", (waitlist_id,), one=True)["status"]
+
+
+def test_sweep_allocates_a_free_spot_to_an_entry_from_another_process(repo):
+    start = datetime.now() + timedelta(hours=1)
+    first = add_waiting(repo, 1, start, start + timedelta(hours=2))
+    second = add_waiting(repo, 2, start, start + timedelta(hours=2))
+
+    waitlist._release_shard(repo, 0)
+
+    assert waitlist_status(repo, first) == "allocated"
+    assert waitlist_status(repo, second) == "waiting"
+    assert repo.get_lot(1)["available_spots"] == 0
+
+
+def test_sweep_expires_entries_that_already_ended(repo):
+    start = datetime.now() - timedelta(hours=3)
+    expired = add_waiting(repo, 1, start, start + timedelta(hours=1))
+
+    waitlist._release_shard(repo, 0)
+
+    assert waitlist_status(repo, expired) == "expired"
+    assert repo.get_lot(1)["available_spots"] == 1
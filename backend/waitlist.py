@@ -0,0 +1,189 @@
+from repository import get_repository, ReservationError
+from database import mark_write
+from datetime import datetime
+import events
+import heapq
+import os
+import threading
+import time
+
+# other API processes add entries too, so the in-memory heaps are reloaded from the table periodically
+RELOAD_SECONDS = float(os.getenv("WAITLIST_RELOAD_SECONDS", "30"))
+# also how often waiting entries are matched against free spots read from the database
+EXPIRY_CHECK_SECONDS = float(os.getenv("RESERVATION_EXPIRY_CHECK_SECONDS", "60"))
+
+# lot_id -> (loaded_at, heap of (-priority, created_at, waitlist_id, entry))
+_queues = {}
+_lock = threading.Lock()
+
+
+def _heap_item(entry):
+    return (-entry["priority"], entry["created_at"], entry["waitlist_id"], entry)
+
+
+def _queue(tx, lot_id):
+    with _lock:
+        cached = _queues.get(lot_id)
+    if cached and time.monotonic() - cached[0] < RELOAD_SECONDS:
+        return cached[1]
+
+    heap = [_heap_item(entry) for entry in tx.waiting_entries(lot_id)]
+    heapq.heapify(heap)
+    with _lock:
+        _queues[lot_id] = (time.monotonic(), heap)
+    return heap
+
+
+def invalidate(lot_id):
+    with _lock:
+        _queues.pop(lot_id, None)
+
+
+def describe(entry):
+    return {
+        "waitlist_id": entry["waitlist_id"],
+        "user_id": entry["user_id"],
+        "lot_id": entry["lot_id"],
+        "start_time": entry["start_time"].isoformat(),
+        "end_time": entry["end_time"].isoformat(),
+        "position": entry.get("position"),
+    }
+
+
+def enqueue(tx, user_id, lot_id, start_time, end_time, priority=0):
+    existing = tx.find_waitlist_entry(user_id, lot_id, start_time, end_time)
+    if existing:
+        return existing
+
+    position = tx.count_waiting(lot_id) + 1
+    waitlist_id = tx.add_waitlist_entry(user_id, lot_id, start_time, end_time, priority)
+    return {
+        "waitlist_id": waitlist_id,
+        "user_id": user_id,
+        "lot_id": lot_id,
+        "start_time": start_time,
+        "end_time": end_time,
+        "priority": priority,
+        "created_at": datetime.now(),
+        "position": position,
+    }
+
+
+def track(entry):
+    # call after the enqueueing transaction commits
+    with _lock:
+        cached = _queues.get(entry["lot_id"])
+        if cached and not any(item[2] == entry["waitlist_id"] for item in cached[1]):
+            heapq.heappush(cached[1], _heap_item(entry))
+
+
+def allocate_next(tx, lot_id):
+    heap = _queue(tx, lot_id)
+    now = datetime.now()
+
+    while True:
+        with _lock:
+            if not heap:
+                return None
+            item = heapq.heappop(heap)
+        entry = item[3]
+
+        if entry["end_time"] <= now:
+            tx.set_waitlist_status(entry["waitlist_id"], "expired", "waiting")
+            continue
+
+        # another process may have allocated this entry already
+        if not tx.set_waitlist_status(entry["waitlist_id"], "allocated", "waiting"):
+            continue
+
+        try:
+            reservation_id, total_cost = tx.make_reservation(
+                entry["user_id"], lot_id, entry["start_time"], entry["end_time"]
+            )
+        except ReservationError:
+            # the released spot cannot be used (e.g. the lot was closed), keep the entry waiting
+            tx.set_waitlist_status(entry["waitlist_id"], "waiting", "allocated")
+            with _lock:
+                heapq.heappush(heap, item)
+            return None
+
+        tx.complete_waitlist_entry(entry["waitlist_id"], reservation_id)
+        return {
+            "waitlist_id": entry["waitlist_id"],
+            "reservation_id": reservation_id,
+            "user_id": entry["user_id"],
+            "lot_id": lot_id,
+            "total_cost": float(total_cost),
+        }
+
+
+def notify(allocations):
+    # call after the allocating transaction commits. There is no push channel to drivers: the allocation
+    # is only logged, and clients learn about it by polling GET /parking/waitlist/{user_id}
+    reservation_ids = []
+    for allocation in allocations:
+        if not allocation:
+            continue
+        mark_write(allocation["user_id"])
+        reservation_ids.append(allocation["reservation_id"])
+        print(
+            f"Waitlist entry {allocation['waitlist_id']} allocated reservation "
+            f"{allocation['reservation_id']} in lot {allocation['lot_id']} to user {allocation['user_id']}"
+        )
+    if reservation_ids:
+        events.publish(events.RESERVATIONS_CHANGED, reservation_ids)
+
+
+def _release_shard(repo, shard_id):
+    tx = repo.begin(shard_id)
+    allocations = []
+    lot_ids = set()
+    completed = []
+    try:
+        for reservation in tx.ended_reservations(datetime.now()):
+            lot_ids.add(reservation["lot_id"])
+            completed.append(reservation["reservation_id"])
+            tx.set_reservation_status(reservation["reservation_id"], "completed")
+            allocations.append(allocate_next(tx, reservation["lot_id"]))
+
+        # entries enqueued by another process, or committed after the release that freed their spot,
+        # are not in this process's heaps; sweep every lot the database says has both free spots and waiters
+        for lot in tx.lots_to_allocate():
+            lot_ids.add(lot["lot_id"])
+            invalidate(lot["lot_id"])
+            for _ in range(lot["available_spots"]):
+                allocation = allocate_next(tx, lot["lot_id"])
+                if not allocation:
+                    break
+                allocations.append(allocation)
+        tx.commit()
+    except Exception:
+        tx.rollback()
+        for lot_id in lot_ids:
+            invalidate(lot_id)
+        raise
+    finally:
+        tx.close()
+
+    if completed:
+        events.publish(events.RESERVATIONS_CHANGED, completed)
+    notify(allocations)
+
+
+def release_ended_reservations():
+    repo = get_repository()
+    for shard_id in repo.shard_ids():
+        _release_shard(repo, shard_id)
+
+
+def _expiry_loop():
+    while True:
+        try:
+            release_ended_reservations()
+        except Exception as e:
+            print("Error releasing ended reservations:", e)
+        time.sleep(EXPIRY_CHECK_SECONDS)
+
+
+def start():
+    threading.Thread(target=_expiry_loop, name="reservation-expiry", daemon=True).start()
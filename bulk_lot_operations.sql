@@ -0,0 +1,31 @@
+-- Bulk parking lot operations
+-- Run this in MySQL Workbench after advanced_database_features.sql
+
+USE smart_parking_database_1;
+
+-- Bulk updates from POST /admin/lots/bulk write their audit rows in a single
+-- multi-row insert and set @skip_lot_audit so the trigger does not duplicate them
+DROP TRIGGER IF EXISTS parking_lot_audit_trigger;
+DELIMITER $$
+CREATE TRIGGER parking_lot_audit_trigger
+AFTER UPDATE ON parking_lots
+FOR EACH ROW
+BEGIN
+    IF @skip_lot_audit IS NULL THEN
+        IF OLD.hourly_rate != NEW.hourly_rate THEN
+            INSERT INTO parking_lot_audit (lot_id, action, old_value, new_value)
+            VALUES (NEW.lot_id, 'rate_change', OLD.hourly_rate, NEW.hourly_rate);
+        END IF;
+        
+        IF OLD.status != NEW.status THEN
+            INSERT INTO parking_lot_audit (lot_id, action, old_value, new_value)
+            VALUES (NEW.lot_id, 'status_change', OLD.status, NEW.status);
+        END IF;
+    END IF;
+END$$
+DELIMITER ;
+
+-- Bulk filters select lots by location and status
+CREATE INDEX idx_parking_lots_location_status ON parking_lots (location, status);
+
+SELECT 'Bulk lot operations installed successfully!' AS status;
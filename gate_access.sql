@@ -0,0 +1,11 @@
+-- License-plate gate check-in/check-out
+-- Run this in MySQL Workbench after query_indexes.sql
+
+USE smart_parking_database_1;
+
+-- set by POST /gate/check-in and /gate/check-out; check-out also completes the reservation
+ALTER TABLE reservations
+    ADD COLUMN checked_in_at DATETIME NULL,
+    ADD COLUMN checked_out_at DATETIME NULL;
+
+SELECT 'Gate access columns created successfully!' AS status;
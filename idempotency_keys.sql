@@ -0,0 +1,18 @@
+-- Idempotency keys for POST /parking/book
+-- Run this in MySQL Workbench after the main database is created
+
+USE smart_parking_database_1;
+
+-- Stores the first response returned for each Idempotency-Key so client retries
+-- can be answered without calling make_reservation1 again
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    idem_key VARCHAR(128) NOT NULL,
+    user_id INT NOT NULL,
+    request_hash CHAR(64) NOT NULL,
+    response JSON NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (idem_key),
+    KEY idx_idem_created (created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+SELECT 'Idempotency keys table created successfully!' AS status;
@@ -0,0 +1,38 @@
+-- Indexes for the queries issued by the API
+-- Run this in MySQL Workbench after reservation_archival.sql
+-- backend/check_query_plans.py checks the plans these indexes are meant to produce
+
+USE smart_parking_database_1;
+
+-- ============================================
+-- 1. RESERVATIONS
+-- ============================================
+
+-- (lot_id, status, total_cost) covers the active-booking check in delete_parking_lot
+-- and the per-lot revenue aggregates in analytics without touching the rows;
+-- (user_id, created_at) returns a user's bookings already ordered
+ALTER TABLE reservations
+    ADD KEY idx_lot_status_cost (lot_id, status, total_cost),
+    ADD KEY idx_user_created (user_id, created_at),
+    ADD KEY idx_created (created_at),
+    ADD KEY idx_status_end (status, end_time),
+    ADD KEY idx_start (start_time),
+    DROP KEY lot_id,
+    DROP KEY user_id;
+
+-- ============================================
+-- 2. USERS AND SPOTS
+-- ============================================
+
+ALTER TABLE users
+    ADD KEY idx_users_created (created_at),
+    ADD KEY idx_users_role (role);
+
+-- the reservation triggers look for the first free/occupied spot of a lot
+ALTER TABLE parking_spots
+    ADD KEY idx_spots_lot_occupied (lot_id, is_occupied),
+    DROP KEY lot_id;
+
+ANALYZE TABLE reservations, users, parking_spots;
+
+SELECT 'Query indexes created successfully!' AS status;
@@ -0,0 +1,104 @@
+-- Reservation partitioning and archival for Smart Parking System
+-- Run this in MySQL Workbench after create_stored_procedure.sql and advanced_database_features.sql
+-- This adds: Monthly range partitions on reservations, an archive table, and partition maintenance
+
+USE smart_parking_database_1;
+
+-- ============================================
+-- 1. PARTITION RESERVATIONS BY MONTH
+-- ============================================
+
+-- MySQL does not allow foreign keys on partitioned tables, and every unique key
+-- must include the partitioning column
+ALTER TABLE reservations
+    DROP FOREIGN KEY reservations_ibfk_1,
+    DROP FOREIGN KEY reservations_ibfk_2;
+
+ALTER TABLE reservations
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (reservation_id, start_time),
+    ADD KEY idx_status_start (status, start_time);
+
+ALTER TABLE reservations
+PARTITION BY RANGE COLUMNS(start_time) (
+    PARTITION p_history VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025_01 VALUES LESS THAN ('2025-02-01'),
+    PARTITION p2025_02 VALUES LESS THAN ('2025-03-01'),
+    PARTITION p2025_03 VALUES LESS THAN ('2025-04-01'),
+    PARTITION p2025_04 VALUES LESS THAN ('2025-05-01'),
+    PARTITION p2025_05 VALUES LESS THAN ('2025-06-01'),
+    PARTITION p2025_06 VALUES LESS THAN ('2025-07-01'),
+    PARTITION p2025_07 VALUES LESS THAN ('2025-08-01'),
+    PARTITION p2025_08 VALUES LESS THAN ('2025-09-01'),
+    PARTITION p2025_09 VALUES LESS THAN ('2025-10-01'),
+    PARTITION p2025_10 VALUES LESS THAN ('2025-11-01'),
+    PARTITION p2025_11 VALUES LESS THAN ('2025-12-01'),
+    PARTITION p2025_12 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026_01 VALUES LESS THAN ('2026-02-01'),
+    PARTITION p2026_02 VALUES LESS THAN ('2026-03-01'),
+    PARTITION p2026_03 VALUES LESS THAN ('2026-04-01'),
+    PARTITION p2026_04 VALUES LESS THAN ('2026-05-01'),
+    PARTITION p2026_05 VALUES LESS THAN ('2026-06-01'),
+    PARTITION p2026_06 VALUES LESS THAN ('2026-07-01'),
+    PARTITION p2026_07 VALUES LESS THAN ('2026-08-01'),
+    PARTITION p2026_08 VALUES LESS THAN ('2026-09-01'),
+    PARTITION p2026_09 VALUES LESS THAN ('2026-10-01'),
+    PARTITION p2026_10 VALUES LESS THAN ('2026-11-01'),
+    PARTITION p2026_11 VALUES LESS THAN ('2026-12-01'),
+    PARTITION p2026_12 VALUES LESS THAN ('2027-01-01'),
+    PARTITION p_future VALUES LESS THAN (MAXVALUE)
+);
+
+-- The ON DELETE CASCADE behaviour the foreign keys provided is now handled by
+-- delete_user and delete_parking_lot in backend/routes/admin.py
+
+-- Procedure: Split p_future so that the month starting at p_month gets its own partition
+DROP PROCEDURE IF EXISTS add_reservation_partition;
+DELIMITER $$
+CREATE PROCEDURE add_reservation_partition(IN p_month DATE)
+BEGIN
+    DECLARE v_start DATE;
+    DECLARE v_name VARCHAR(20);
+
+    SET v_start = DATE_FORMAT(p_month, '%Y-%m-01');
+    SET v_name = CONCAT('p', DATE_FORMAT(v_start, '%Y_%m'));
+
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.partitions
+        WHERE table_schema = DATABASE()
+        AND table_name = 'reservations'
+        AND partition_name = v_name
+    ) THEN
+        SET @sql = CONCAT(
+            'ALTER TABLE reservations REORGANIZE PARTITION p_future INTO (',
+            'PARTITION ', v_name, ' VALUES LESS THAN (''', DATE_ADD(v_start, INTERVAL 1 MONTH), '''), ',
+            'PARTITION p_future VALUES LESS THAN (MAXVALUE))'
+        );
+        PREPARE stmt FROM @sql;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+DELIMITER ;
+
+-- ============================================
+-- 2. ARCHIVE TABLE
+-- ============================================
+
+-- Completed and cancelled reservations are moved here by backend/archive_reservations.py
+CREATE TABLE IF NOT EXISTS reservations_archive (
+    reservation_id INT NOT NULL,
+    user_id INT NOT NULL,
+    lot_id INT NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    total_cost DECIMAL(10,2) NOT NULL,
+    status ENUM('active','completed','cancelled') NOT NULL,
+    created_at TIMESTAMP NULL,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (reservation_id),
+    KEY idx_archive_user (user_id, created_at),
+    KEY idx_archive_start (start_time)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+SELECT 'Reservation partitioning and archive table created successfully!' AS status;
@@ -0,0 +1,20 @@
+-- Spot sensor ingestion
+-- Run this in MySQL Workbench after query_indexes.sql
+
+USE smart_parking_database_1;
+
+-- sensor flushes look spots up by (lot_id, spot_number) in bulk
+ALTER TABLE parking_spots
+    ADD KEY idx_spots_lot_number (lot_id, spot_number);
+
+-- what the sensors see, kept apart from is_occupied and available_spots, which the reservation
+-- triggers maintain; NULL until a spot's first reading. sensor_observed_at is the time of the reading
+-- stored, so a late reading flushed by another API process cannot overwrite a newer one
+ALTER TABLE parking_spots
+    ADD COLUMN sensor_occupied TINYINT(1) NULL,
+    ADD COLUMN sensor_observed_at DATETIME(6) NULL;
+
+ALTER TABLE parking_lots
+    ADD COLUMN sensor_occupied_spots INT NOT NULL DEFAULT 0;
+
+SELECT 'Sensor ingestion columns and index created successfully!' AS status;
@@ -0,0 +1,54 @@
+-- Sharding by region
+-- Create each new shard by running every script above (up to gate_access.sql) on its server, then this one.
+-- Run it on the existing database too (with @shard_id = 0) to create user_shards.
+-- Set @shard_id to the shard's number from DB_SHARDS before running.
+
+USE smart_parking_database_1;
+
+SET @shard_id = COALESCE(@shard_id, 0);
+-- must match DB_SHARD_ID_STRIDE in backend/.env
+SET @shard_id_stride = COALESCE(@shard_id_stride, 100000000);
+
+-- ============================================
+-- 1. ID RANGES
+-- ============================================
+
+-- each shard hands out lot, spot, reservation and waitlist ids from its own range,
+-- so the backend finds a row's shard from the id alone (id DIV stride)
+SET @first_id = @shard_id * @shard_id_stride + 1;
+
+SET @sql = CONCAT('ALTER TABLE parking_lots AUTO_INCREMENT = ', @first_id);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+SET @sql = CONCAT('ALTER TABLE parking_spots AUTO_INCREMENT = ', @first_id);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+SET @sql = CONCAT('ALTER TABLE reservations AUTO_INCREMENT = ', @first_id);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+SET @sql = CONCAT('ALTER TABLE waitlist AUTO_INCREMENT = ', @first_id);
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- ============================================
+-- 2. USERS
+-- ============================================
+
+-- users only exist on shard 0, so other shards cannot keep the waitlist's user foreign key;
+-- delete_user in backend/routes/admin.py removes a user's rows from every shard instead
+SET @sql = IF(@shard_id = 0, 'DO 0', 'ALTER TABLE waitlist DROP FOREIGN KEY waitlist_ibfk_1');
+PREPARE stmt FROM @sql; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- ============================================
+-- 3. USER -> SHARD INDEX
+-- ============================================
+
+-- users and vehicles stay on shard 0; this lists the other shards holding a user's
+-- reservations so "my bookings" only queries those. Only shard 0's copy is used.
+CREATE TABLE IF NOT EXISTS user_shards (
+    user_id INT NOT NULL,
+    shard_id INT NOT NULL,
+    PRIMARY KEY (user_id, shard_id),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+SELECT CONCAT('Shard ', @shard_id, ' prepared successfully!') AS status;
@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import axios from "axios";
 import {
@@ -17,6 +17,9 @@ import {
 import { useAuth } from "../context/AuthContext1";
 import "../styles/AdminDashboard.css";
 
+// matches USERS_PAGE_SIZE in backend/routes/admin.py
+const USERS_PAGE_SIZE = 50;
+
 function AdminDashboard() {
   const { user, logout } = useAuth();
   const navigate = useNavigate();
@@ -24,6 +27,10 @@ function AdminDashboard() {
   const [lots, setLots] = useState([]);
   const [bookings, setBookings] = useState([]);
   const [users, setUsers] = useState([]);
+  const [hasMoreUsers, setHasMoreUsers] = useState(false);
+  const [userQuery, setUserQuery] = useState("");
+  const [userMatches, setUserMatches] = useState(null);
+  const latestUserQuery = useRef("");
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
   const [activeTab, setActiveTab] = useState("overview");
@@ -60,46 +67,28 @@ function AdminDashboard() {
       setLoading(true);
       setError("");
       
-      const results = await Promise.allSettled([
-        axios.get("http://127.0.0.1:8000/admin/stats"),
-        axios.get("http://127.0.0.1:8000/admin/lots/manage"),
-        axios.get("http://127.0.0.1:8000/admin/bookings"),
-        axios.get("http://127.0.0.1:8000/admin/users"),
-        axios.get("http://127.0.0.1:8000/admin/analytics").catch(() => ({ data: null }))
-      ]);
-
-      if (results[0].status === 'fulfilled') {
-        setStats(results[0].value.data);
-      } else {
-        console.error("Failed to load stats:", results[0].reason);
-      }
+      // one request; the backend loads the sections concurrently and reports failed ones in `errors`
+      const response = await axios.get("http://127.0.0.1:8000/admin/dashboard");
+      const data = response.data;
+      const errors = data.errors || {};
 
-      if (results[1].status === 'fulfilled') {
-        setLots(results[1].value.data.lots || []);
-      } else {
-        console.error("Failed to load lots:", results[1].reason);
-        setLots([]);
+      if (data.stats) {
+        setStats(data.stats);
       }
-
-      if (results[2].status === 'fulfilled') {
-        setBookings(results[2].value.data.bookings || []);
-      } else {
-        console.error("Failed to load bookings:", results[2].reason);
-        setBookings([]);
+      setLots(data.lots || []);
+      setBookings(data.bookings || []);
+      // the dashboard only carries the newest page of users; older ones are paged in or searched for
+      setUsers(data.users || []);
+      setHasMoreUsers((data.users || []).length === USERS_PAGE_SIZE);
+      if (data.analytics) {
+        setAnalytics(data.analytics);
       }
 
-      if (results[3].status === 'fulfilled') {
-        setUsers(results[3].value.data.users || []);
-      } else {
-        console.error("Failed to load users:", results[3].reason);
-        setUsers([]);
-      }
-
-      if (results[4].status === 'fulfilled' && results[4].value.data) {
-        setAnalytics(results[4].value.data);
-      }
+      Object.entries(errors).forEach(([section, detail]) => {
+        console.error(`Failed to load ${section}:`, detail);
+      });
 
-      const criticalFailures = results.slice(0, 4).filter(r => r.status === 'rejected');
+      const criticalFailures = ["stats", "lots", "bookings", "users"].filter(section => errors[section]);
       if (criticalFailures.length > 0) {
         setError(`Failed to load some data. Check console for details.`);
       }
@@ -111,6 +100,39 @@ function AdminDashboard() {
     }
   };
 
+  const loadMoreUsers = async () => {
+    try {
+      const res = await axios.get("http://127.0.0.1:8000/admin/users", {
+        params: { limit: USERS_PAGE_SIZE, offset: users.length }
+      });
+      const page = res.data.users || [];
+      setUsers((current) => [...current, ...page]);
+      setHasMoreUsers(page.length === USERS_PAGE_SIZE);
+    } catch (err) {
+      console.error("Loading users failed:", err);
+    }
+  };
+
+  const handleUserSearch = async (query) => {
+    setUserQuery(query);
+    latestUserQuery.current = query;
+    if (!query.trim()) {
+      setUserMatches(null);
+      return;
+    }
+    try {
+      const res = await axios.get("http://127.0.0.1:8000/admin/search", {
+        params: { q: query, kind: "users", limit: 50 }
+      });
+      // typing faster than the responses arrive must not show results for an older query
+      if (latestUserQuery.current === query) {
+        setUserMatches(res.data.users || []);
+      }
+    } catch (err) {
+      console.error("User search failed:", err);
+    }
+  };
+
   const handleEditLot = (lot) => {
     setSelectedLot(lot);
     setEditForm({
@@ -522,7 +544,14 @@ function AdminDashboard() {
         {activeTab === "users" && (
           <Card className="mt-4">
             <Card.Header className="d-flex justify-content-between align-items-center">
-              <h5 className="mb-0">All Users</h5>
+              <h5 className="mb-0">Users</h5>
+              <Form.Control
+                type="search"
+                placeholder="Search by name or email"
+                value={userQuery}
+                onChange={(e) => handleUserSearch(e.target.value)}
+                className="w-50"
+              />
               <Button
                 variant="success"
                 onClick={() => setShowCreateUserModal(true)}
@@ -543,7 +572,7 @@ function AdminDashboard() {
                   </tr>
                 </thead>
                 <tbody>
-                  {users.map((u) => (
+                  {(userMatches ?? users).map((u) => (
                     <tr key={u.user_id}>
                       <td>{u.user_id}</td>
                       <td>{u.name}</td>
@@ -570,12 +599,26 @@ function AdminDashboard() {
                   ))}
                 </tbody>
               </Table>
+              {userMatches === null && hasMoreUsers && (
+                <div className="text-center">
+                  <Button variant="outline-primary" onClick={loadMoreUsers}>
+                    Load more
+                  </Button>
+                </div>
+              )}
             </Card.Body>
           </Card>
         )}
 
         {activeTab === "analytics" && analytics && (
           <Row className="mt-4">
+            {analytics.errors && analytics.errors.length > 0 && (
+              <Col md={12}>
+                <Alert variant="warning">
+                  Some analytics could not be loaded and are incomplete: {analytics.errors.join("; ")}
+                </Alert>
+              </Col>
+            )}
             <Col md={6} className="mb-4">
               <Card className="shadow-lg">
                 <Card.Header>
@@ -1,7 +1,7 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { useNavigate, useLocation } from "react-router-dom";
 import axios from "axios";
-import { Card, Spinner, Alert, Container, Row, Col, Button, Badge, Table } from "react-bootstrap";
+import { Card, Spinner, Alert, Container, Row, Col, Button, Badge, Table, Form } from "react-bootstrap";
 import { useAuth } from "../context/AuthContext1";
 import "../styles/Dashboard.css";
 
@@ -13,17 +13,43 @@ function Dashboard() {
   const [bookings, setBookings] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState("");
+  const [staleAsOf, setStaleAsOf] = useState(null);
   const [activeTab, setActiveTab] = useState("lots");
+  const [lotQuery, setLotQuery] = useState("");
+  const [lotMatches, setLotMatches] = useState(null);
+  const latestLotQuery = useRef("");
 
   const fetchLots = async () => {
     try {
       const res = await axios.get("http://127.0.0.1:8000/parking/lots");
       setLots(res.data.parking_lots);
+      // the backend answers from its last good copy while the database is unreachable
+      setStaleAsOf(res.data.stale ? res.data.as_of : null);
     } catch (err) {
       setError("Failed to load parking lots");
     }
   };
 
+  const handleLotSearch = async (query) => {
+    setLotQuery(query);
+    latestLotQuery.current = query;
+    if (!query.trim()) {
+      setLotMatches(null);
+      return;
+    }
+    try {
+      const res = await axios.get("http://127.0.0.1:8000/parking/lots/search", {
+        params: { q: query, limit: 50 }
+      });
+      // the search index has no availability, so matches pick cards out of the loaded lots
+      if (latestLotQuery.current === query) {
+        setLotMatches(new Set((res.data.parking_lots || []).map((lot) => lot.lot_id)));
+      }
+    } catch (err) {
+      console.error("Lot search failed:", err);
+    }
+  };
+
   const fetchBookings = async () => {
     if (!user?.user_id) return;
     try {
@@ -128,6 +154,12 @@ function Dashboard() {
         </Container>
       </div>
 
+      {staleAsOf && (
+        <Alert variant="warning" className="m-3 text-center">
+          Availability may be out of date (last updated {new Date(staleAsOf).toLocaleTimeString()}).
+        </Alert>
+      )}
+
       <Container className="mt-4">
         <div className="mb-4 text-center">
           <Button
@@ -153,10 +185,17 @@ function Dashboard() {
                 <p className="text-center text-muted">
                   Select a parking lot to book your spot
                 </p>
+                <Form.Control
+                  type="search"
+                  placeholder="Search by lot name or location"
+                  value={lotQuery}
+                  onChange={(e) => handleLotSearch(e.target.value)}
+                  className="w-50 mx-auto"
+                />
               </Col>
             </Row>
             <Row>
-          {lots.map((lot) => (
+          {lots.filter((lot) => lotMatches === null || lotMatches.has(lot.lot_id)).map((lot) => (
             <Col md={4} lg={3} key={lot.lot_id} className="mb-4">
               <Card className="lot-card shadow-lg">
                 <Card.Body className="p-4 position-relative">
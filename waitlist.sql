@@ -0,0 +1,24 @@
+-- Waitlist for full parking lots
+-- Run this in MySQL Workbench after the main database is created
+
+USE smart_parking_database_1;
+
+-- Requests for full lots wait here and are turned into reservations when a spot is released
+CREATE TABLE IF NOT EXISTS waitlist (
+    waitlist_id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    lot_id INT NOT NULL,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NOT NULL,
+    priority INT NOT NULL DEFAULT 0,
+    status ENUM('waiting','allocated','expired','cancelled') NOT NULL DEFAULT 'waiting',
+    reservation_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    allocated_at TIMESTAMP NULL,
+    KEY idx_waitlist_lot (lot_id, status),
+    KEY idx_waitlist_user (user_id, created_at),
+    CONSTRAINT waitlist_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+    CONSTRAINT waitlist_ibfk_2 FOREIGN KEY (lot_id) REFERENCES parking_lots (lot_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+SELECT 'Waitlist table created successfully!' AS status;